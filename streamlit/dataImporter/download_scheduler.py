@@ -0,0 +1,154 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+
+class RateLimiter:
+    """Spaces request starts at least 1 / rate seconds apart, across threads"""
+
+    def __init__(self, rate=None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 0. if not rate else 1. / rate
+        self.clock = clock
+        self.sleep = sleep
+        self.next_time = 0.
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if self.interval == 0.:
+            return
+        with self.lock:
+            now = self.clock()
+            start = max(now, self.next_time)
+            self.next_time = start + self.interval
+        if start > now:
+            self.sleep(start - now)
+
+
+class DownloadScheduler:
+    """
+    Batched, concurrent and retrying price downloads.
+
+    source: price source with fetch(tickers, start, end) -> DataFrame (dates x tickers),
+            e.g. YFinanceSource or FixtureSource from incremental_import
+    batch_size: tickers per request
+    max_workers: concurrent requests
+    rate: maximum requests started per second (None for no limit)
+    max_retries: retries of a failed ticker, with exponential backoff (backoff, 2 * backoff, ...)
+    sleep: sleep function used for backoff and rate limiting
+
+    A ticker fails when its request raises, or when it comes back without prices while other
+    tickers of the same batch have some (an empty batch means there is no data in the range).
+    The scheduler is a price source itself, so it can be passed wherever a source is expected
+    """
+
+    def __init__(self, source, batch_size=50, max_workers=4, rate=None, max_retries=3, backoff=1.,
+                 sleep=time.sleep):
+        self.source = source
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(rate, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.timings = []
+        self.failed = {}
+
+    def batches(self, tickers):
+        tickers = list(tickers)
+        return [tickers[i:i + self.batch_size] for i in range(0, len(tickers), self.batch_size)]
+
+    def download(self, tickers, start, end, attempt):
+        """Fetch one batch, returns the prices (None if the request failed) and the elapsed time"""
+        if attempt > 0:
+            self.sleep(self.backoff * 2 ** (attempt - 1))
+        self.rate_limiter.wait()
+        started = time.perf_counter()
+        try:
+            prices = self.source.fetch(tickers, start, end)
+        except Exception as e:
+            print(f"Request for {len(tickers)} tickers failed: {e}")
+            prices = None
+        return prices, time.perf_counter() - started
+
+    def run(self, jobs, start, end, on_complete=None):
+        """
+        Download several ticker lists at once.
+        jobs: {dataset name: tickers}
+        on_complete(name, prices): called as soon as every batch of a dataset is done, so each
+        dataset can be stored while the others are still downloading
+        Returns {dataset name: prices DataFrame}; tickers still failing after the retries are
+        missing from the frames and listed in self.failed
+        """
+        results = {name: [] for name in jobs}
+        pending = {name: 0 for name in jobs}
+        self.failed = {name: [] for name in jobs}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+
+            def submit(name, tickers, attempt):
+                future = executor.submit(self.download, tickers, start, end, attempt)
+                futures[future] = (name, tickers, attempt)
+                pending[name] += 1
+
+            for name, tickers in jobs.items():
+                for batch in self.batches(tickers):
+                    submit(name, batch, 0)
+            total = len(futures)
+            done_count = 0
+
+            while futures:
+                done, _ = wait(list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, tickers, attempt = futures.pop(future)
+                    pending[name] -= 1
+                    done_count += 1
+                    prices, elapsed = future.result()
+
+                    # 1. Tickers to retry
+                    if prices is None:
+                        missing = list(tickers)
+                    else:
+                        prices = prices.dropna(axis=1, how='all')
+                        missing = [] if prices.empty else [t for t in tickers if t not in prices.columns]
+                        if not prices.empty:
+                            results[name].append(prices)
+
+                    self.timings.append({'dataset': name, 'tickers': len(tickers), 'attempt': attempt,
+                                         'seconds': elapsed, 'failed': len(missing)})
+                    print(f"[{done_count}/{total}] {name}: {len(tickers) - len(missing)}/{len(tickers)} tickers "
+                          f"in {elapsed:.2f}s" + (f" (attempt {attempt + 1})" if attempt else ""))
+
+                    if missing:
+                        if attempt < self.max_retries:
+                            # A failed request is retried in two halves, so one bad ticker
+                            # cannot hold back the rest of its batch
+                            halves = [missing] if prices is not None or len(missing) == 1 else \
+                                [missing[:len(missing) // 2], missing[len(missing) // 2:]]
+                            for half in halves:
+                                submit(name, half, attempt + 1)
+                            total += len(halves)
+                        else:
+                            self.failed[name] += missing
+                            print(f"{name}: giving up on {', '.join(missing)}")
+
+                    # 2. Stream the dataset out once all its batches are in
+                    if pending[name] == 0 and on_complete is not None:
+                        on_complete(name, self.combine(results[name], jobs[name]))
+
+        return {name: self.combine(results[name], jobs[name]) for name in jobs}
+
+    @staticmethod
+    def combine(frames, tickers):
+        """Batches side by side, columns in the order of the requested tickers"""
+        if not frames:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name='Date'))
+        prices = pd.concat(frames, axis=1).sort_index()
+        prices = prices[[t for t in tickers if t in prices.columns]]
+        prices.index.name = 'Date'
+        return prices
+
+    def fetch(self, tickers, start, end):
+        return self.run({'prices': tickers}, start, end)['prices']
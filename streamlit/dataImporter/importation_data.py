@@ -1,257 +1,337 @@
-def importer_data(start='2016-01-01',end='2025-11-01'):
-    import yfinance as yf
+EQUITY_TICKERS = ['A', 'AAL', 'AAPL', 'ABBV', 'ABNB', 'ABT', 'ACN', 'ADBE', 'ADI', 'ADM','ADP', 'ADSK', 'AEE', 'AEP', 'AES', 'AFL', 'AIG', 'AIZ', 'AJG', 'AKAM', 'ALB', 'ALGN', 'ALK', 'ALL', 'ALLE', 'AMAT', 'AMCR', 'AMD', 'AME', 'AMGN', 'AMP', 'AMT', 'AMZN', 'ANET', 'AON', 'AOS', 'APA', 'APD', 'APH', 'APO', 'APP', 'APTV', 'ARE', 'AVB', 'AVGO', 'AVY', 'AWK', 'AXON', 'AXP', 'AZO', 'BA', 'BAC', 'BBWI', 'BBY', 'BDX', 'BEN', 'BF-B', 'BIIB', 'BK', 'BKNG', 'BLK', 'BMY', 'BR', 'BRK-B', 'BSX', 'BWA', 'BX', 'BXP', 'C', 'CAG', 'CAH', 'CARR', 'CAT', 'CB', 'CBOE', 'CCL', 'CDNS', 'CDW', 'CEG', 'CF', 'CFG', 'CHD', 'CHRW', 'CHTR', 'CI', 'CINF', 'CL', 'CLX', 'CMA', 'CMCSA', 'CME', 'CMG', 'CMI', 'CMS', 'CNC', 'CNP', 'COF', 'COIN', 'COO', 'COP', 'COR', 'COST', 'CPB', 'CPRT', 'CPT', 'CRL', 'CRM', 'CRWD', 'CSCO', 'CSGP', 'CSX', 'CTAS', 'CTRA', 'CTSH', 'CVS', 'CVX', 'D', 'DAL', 'DASH', 'DD', 'DE', 'DECK', 'DG', 'DGX', 'DHI', 'DHR', 'DIS', 'DLR', 'DLTR', 'DOV', 'DOW', 'DPZ', 'DRI', 'DTE', 'DUK', 'DVA', 'DVN', 'DXCM', 'EA', 'EBAY', 'ECL', 'ED', 'EFX', 'EG', 'EIX', 'EL', 'ELV', 'EME',  'EMN', 'EMR', 'EOG', 'EPAM', 'EQIX', 'EQT', 'ERJ', 'ES', 'ESS', 'ETN',  'ETR', 'ETSY', 'EVRG', 'EW', 'EXC', 'EXPD', 'EXPE', 'EXR', 'F', 'FAST', 'FCX', 'FDS', 'FDX', 'FE', 'FFIV', 'FI', 'FICO', 'FIS', 'FITB', 'FMC', 'FOX', 'FOXA', 'FRT', 'FSLR', 'FTNT', 'FTV', 'GD', 'GE', 'GEHC', 'GEV', 'GEN', 'GILD', 'GIS', 'GL', 'GLW', 'GM', 'GNRC', 'GOOG', 'GOOGL', 'GPC',
+    'GPN', 'GRMN', 'GS', 'GWW', 'HAL', 'HAS', 'HBAN', 'HCA', 'HD', 'HIG', 'HII', 'HLT', 'HOLX', 'HON', 'HOOD', 'HPE', 'HPQ', 'HRL', 'HSIC', 'HST', 'HSY', 'HUBB', 'HUM', 'HWM', 'IBM', 'ICE', 'IDXX', 'IEX', 'IFF',  'ILMN', 'INCY', 'INTC', 'INTU', 'INVH', 'IP', 'IPG', 'IQV', 'IR', 'IRM',  'ISRG', 'IT', 'ITW', 'IVZ', 'J', 'JBL', 'JCI', 'JKHY', 'JNJ', 'JPM', 'K', 'KDP', 'KHC', 'KLAC', 'KMB', 'KMI', 'KMX', 'KO', 'KR', 'KVUE', 'L', 'LDOS', 'LEN', 'LH', 'LHX', 'LIN', 'LKQ', 'LLY', 'LMT', 'LNT', 'LOW', 'LRCX', 'LULU', 'LUV', 'LVS', 'LW', 'LYB', 'LYV', 'MA', 'MAA', 'MAR', 'MAS', 'MCD', 'MCHP', 'MCK', 'MCO', 'MDLZ', 'MDT', 'MET', 'META', 'MGM', 'MHK', 'MKC', 'MKTX', 'MLM', 'MMC', 'MMM', 'MNST', 'MO', 'MOH',  'MOS', 'MPC', 'MPWR', 'MRK', 'MRNA', 'MS', 'MSCI', 'MSFT', 'MSI', 'MTB', 'MTCH', 'MTD', 'MU', 'NCLH', 'NDAQ', 'NDSN', 'NEE', 'NEM', 'NFLX',  'NI', 'NKE', 'NOC', 'NOW', 'NRG', 'NSC', 'NTAP', 'NTRS', 'NUE', 'NVDA', 'NVR', 'NWS', 'NWSA', 'NXPI', 'O', 'ODFL', 'OKE', 'OMC', 'ON', 'ORCL', 'ORLY', 'OTIS', 'OXY', 'PANW', 'PAYC', 'PAYX', 'PCAR', 'PCG',
+    'PEG', 'PEP', 'PFE', 'PFG', 'PG', 'PGR', 'PH', 'PHM', 'PKG', 'PLD', 'PLTR', 'PM', 'PNC', 'PNR', 'PNW', 'PODD', 'PPG', 'PPL', 'PRU', 'PSX', 'PTC', 'PWR', 'PYPL', 'QCOM', 'QRVO', 'RCL', 'REG', 'REGN', 'RF', 'RHI', 'RJF', 'RL', 'RMD', 'ROK', 'ROL', 'ROP', 'ROST', 'RSG', 'RTX', 'RVTY', 'SBUX', 'SCHW', 'SHW', 'SJM', 'SLB', 'SMCI', 'SNA', 'SNPS', 'SO', 'SPG', 'SPGI', 'SRE', 'STE', 'STLD', 'STT', 'STX', 'STZ', 'SWK', 'SWKS',  'SYF', 'SYK', 'T', 'TAP', 'TDG', 'TDY', 'TECH', 'TEL', 'TER', 'TFC',  'TFX', 'TGT', 'TJX', 'TKO', 'TMUS', 'TMO', 'TPR', 'TRGP', 'TRMB', 'TROW', 'TRV', 'TSCO', 'TSLA', 'TT', 'TTWO', 'TXN', 'TXT', 'UAL', 'UBER', 'UDR', 'UHS', 'ULTA', 'UNH', 'UNP', 'UPS', 'URI', 'USB', 'V', 'VEEV', 'VLO', 'VLTO', 'VMC', 'VRSK', 'VRSN', 'VRTX', 'VST', 'VTR', 'VTRS', 'VZ', 'WAB', 'WAT', 'WBD', 'WCN', 'WDC', 'WEC', 'WELL', 'WFC', 'WM', 'WMB', 'WMT', 'WRB', 'WST', 'WY', 'WYNN', 'XEL', 'XOM', 'XRAY', 'XYL', 'YUM',
+    'ZBH', 'ZBRA', 'ZTS' ]
+
+CRYPTO_TICKERS = [
+    # --- Top Tier (High Market Cap & Volume) ---
+    'BTC-USD',  # Bitcoin
+    'ETH-USD',  # Ethereum
+    'BNB-USD',  # BNB (Binance Coin)
+    'SOL-USD',  # Solana
+    'XRP-USD',  # XRP
+    'DOGE-USD',  # Dogecoin
+    'ADA-USD',  # Cardano
+    'AVAX-USD',  # Avalanche
+    'DOT-USD',  # Polkadot
+    'LINK-USD',  # Chainlink
+
+    # --- Other High-Volume/Major Ecosystem Coins ---
+    'TRX-USD',  # TRON
+    'LTC-USD',  # Litecoin
+    'BCH-USD',  # Bitcoin Cash
+    'XLM-USD',  # Stellar
+    'SHIB-USD',  # Shiba Inu
+    'TON-USD',  # Toncoin
+    'ICP-USD',  # Internet Computer
+    'NEAR-USD',  # NEAR Protocol
+    'XMR-USD',  # Monero
+    'VET-USD',  # VeChain
+    'ATOM-USD',  # Cosmos
+    'DASH-USD',  # Dash
+    'ZEC-USD',  # Zcash
+
+    # --- DeFi, Gaming, and Web3 Majors ---
+    'AAVE-USD',  # Aave
+    'FIL-USD',  # Filecoin
+    'ETC-USD',  # Ethereum Classic
+]
+
+COMMODITY_TICKERS = [
+    # Energy
+    'CL=F',  # WTI Crude Oil
+    'BZ=F',  # Brent Crude Oil
+    'NG=F',  # Natural Gas
+    'HO=F',  # Heating Oil
+    'RB=F',  # RBOB Gasoline
+
+    # Precious Metals
+    'GC=F',  # Gold
+    'SI=F',  # Silver
+    'PL=F',  # Platinum
+    'PA=F',  # Palladium
+
+    # Industrial Metals
+    'HG=F',  # Copper
+    'ALI=F',  # Aluminum
+    'TIO=F',  # Iron Ore
+
+    # Agriculture
+    'ZC=F',  # Corn
+    'ZS=F',  # Soybeans
+    'ZW=F',  # Wheat
+
+    # Softs
+    'KC=F',  # Coffee
+    'SB=F',  # Sugar
+    'CC=F',  # Cocoa
+    'CT=F',  # Cotton
+    'OJ=F',  # Frozen Concentrated Orange Juice
+
+    # Livestock
+    'LE=F',  # Live Cattle
+    'HE=F',  # Lean Hogs
+    'GF=F',  # Feeder Cattle
+]
+
+BOND_TICKERS = ['AGG']
+
+
+def importer_data(start='2016-01-01',end='2025-11-01', parallel=False, max_workers=None, incremental=False, source=None,
+                  download_workers=4, force=False):
     import os
     import sys
     from pathlib import Path
     sys.path.append(str(Path(__file__).parent.parent))
     import utils.utilities as ut
+    import utils.erc_solver as es
+    import utils.meanvar_lookup as mvl
+    import utils.incremental_backtest as ib
+    import dataImporter.return_store as rs
+    import dataImporter.return_cube as rc
+    import dataImporter.incremental_import as ii
+    import dataImporter.download_scheduler as ds
+    import dataImporter.pipeline as pl
+    import utils.screens as sc
     import requests
     import pandas as pd
     import time
-    from scipy.optimize import minimize
     import numpy as np
     
-    # Equity
-    def import_equity(start_date, end_date):
-        sp500_tickers = ['A', 'AAL', 'AAPL', 'ABBV', 'ABNB', 'ABT', 'ACN', 'ADBE', 'ADI', 'ADM','ADP', 'ADSK', 'AEE', 'AEP', 'AES', 'AFL', 'AIG', 'AIZ', 'AJG', 'AKAM', 'ALB', 'ALGN', 'ALK', 'ALL', 'ALLE', 'AMAT', 'AMCR', 'AMD', 'AME', 'AMGN', 'AMP', 'AMT', 'AMZN', 'ANET', 'AON', 'AOS', 'APA', 'APD', 'APH', 'APO', 'APP', 'APTV', 'ARE', 'AVB', 'AVGO', 'AVY', 'AWK', 'AXON', 'AXP', 'AZO', 'BA', 'BAC', 'BBWI', 'BBY', 'BDX', 'BEN', 'BF-B', 'BIIB', 'BK', 'BKNG', 'BLK', 'BMY', 'BR', 'BRK-B', 'BSX', 'BWA', 'BX', 'BXP', 'C', 'CAG', 'CAH', 'CARR', 'CAT', 'CB', 'CBOE', 'CCL', 'CDNS', 'CDW', 'CEG', 'CF', 'CFG', 'CHD', 'CHRW', 'CHTR', 'CI', 'CINF', 'CL', 'CLX', 'CMA', 'CMCSA', 'CME', 'CMG', 'CMI', 'CMS', 'CNC', 'CNP', 'COF', 'COIN', 'COO', 'COP', 'COR', 'COST', 'CPB', 'CPRT', 'CPT', 'CRL', 'CRM', 'CRWD', 'CSCO', 'CSGP', 'CSX', 'CTAS', 'CTRA', 'CTSH', 'CVS', 'CVX', 'D', 'DAL', 'DASH', 'DD', 'DE', 'DECK', 'DG', 'DGX', 'DHI', 'DHR', 'DIS', 'DLR', 'DLTR', 'DOV', 'DOW', 'DPZ', 'DRI', 'DTE', 'DUK', 'DVA', 'DVN', 'DXCM', 'EA', 'EBAY', 'ECL', 'ED', 'EFX', 'EG', 'EIX', 'EL', 'ELV', 'EME',  'EMN', 'EMR', 'EOG', 'EPAM', 'EQIX', 'EQT', 'ERJ', 'ES', 'ESS', 'ETN',  'ETR', 'ETSY', 'EVRG', 'EW', 'EXC', 'EXPD', 'EXPE', 'EXR', 'F', 'FAST', 'FCX', 'FDS', 'FDX', 'FE', 'FFIV', 'FI', 'FICO', 'FIS', 'FITB', 'FMC', 'FOX', 'FOXA', 'FRT', 'FSLR', 'FTNT', 'FTV', 'GD', 'GE', 'GEHC', 'GEV', 'GEN', 'GILD', 'GIS', 'GL', 'GLW', 'GM', 'GNRC', 'GOOG', 'GOOGL', 'GPC',
-            'GPN', 'GRMN', 'GS', 'GWW', 'HAL', 'HAS', 'HBAN', 'HCA', 'HD', 'HIG', 'HII', 'HLT', 'HOLX', 'HON', 'HOOD', 'HPE', 'HPQ', 'HRL', 'HSIC', 'HST', 'HSY', 'HUBB', 'HUM', 'HWM', 'IBM', 'ICE', 'IDXX', 'IEX', 'IFF',  'ILMN', 'INCY', 'INTC', 'INTU', 'INVH', 'IP', 'IPG', 'IQV', 'IR', 'IRM',  'ISRG', 'IT', 'ITW', 'IVZ', 'J', 'JBL', 'JCI', 'JKHY', 'JNJ', 'JPM', 'K', 'KDP', 'KHC', 'KLAC', 'KMB', 'KMI', 'KMX', 'KO', 'KR', 'KVUE', 'L', 'LDOS', 'LEN', 'LH', 'LHX', 'LIN', 'LKQ', 'LLY', 'LMT', 'LNT', 'LOW', 'LRCX', 'LULU', 'LUV', 'LVS', 'LW', 'LYB', 'LYV', 'MA', 'MAA', 'MAR', 'MAS', 'MCD', 'MCHP', 'MCK', 'MCO', 'MDLZ', 'MDT', 'MET', 'META', 'MGM', 'MHK', 'MKC', 'MKTX', 'MLM', 'MMC', 'MMM', 'MNST', 'MO', 'MOH',  'MOS', 'MPC', 'MPWR', 'MRK', 'MRNA', 'MS', 'MSCI', 'MSFT', 'MSI', 'MTB', 'MTCH', 'MTD', 'MU', 'NCLH', 'NDAQ', 'NDSN', 'NEE', 'NEM', 'NFLX',  'NI', 'NKE', 'NOC', 'NOW', 'NRG', 'NSC', 'NTAP', 'NTRS', 'NUE', 'NVDA', 'NVR', 'NWS', 'NWSA', 'NXPI', 'O', 'ODFL', 'OKE', 'OMC', 'ON', 'ORCL', 'ORLY', 'OTIS', 'OXY', 'PANW', 'PAYC', 'PAYX', 'PCAR', 'PCG',
-            'PEG', 'PEP', 'PFE', 'PFG', 'PG', 'PGR', 'PH', 'PHM', 'PKG', 'PLD', 'PLTR', 'PM', 'PNC', 'PNR', 'PNW', 'PODD', 'PPG', 'PPL', 'PRU', 'PSX', 'PTC', 'PWR', 'PYPL', 'QCOM', 'QRVO', 'RCL', 'REG', 'REGN', 'RF', 'RHI', 'RJF', 'RL', 'RMD', 'ROK', 'ROL', 'ROP', 'ROST', 'RSG', 'RTX', 'RVTY', 'SBUX', 'SCHW', 'SHW', 'SJM', 'SLB', 'SMCI', 'SNA', 'SNPS', 'SO', 'SPG', 'SPGI', 'SRE', 'STE', 'STLD', 'STT', 'STX', 'STZ', 'SWK', 'SWKS',  'SYF', 'SYK', 'T', 'TAP', 'TDG', 'TDY', 'TECH', 'TEL', 'TER', 'TFC',  'TFX', 'TGT', 'TJX', 'TKO', 'TMUS', 'TMO', 'TPR', 'TRGP', 'TRMB', 'TROW', 'TRV', 'TSCO', 'TSLA', 'TT', 'TTWO', 'TXN', 'TXT', 'UAL', 'UBER', 'UDR', 'UHS', 'ULTA', 'UNH', 'UNP', 'UPS', 'URI', 'USB', 'V', 'VEEV', 'VLO', 'VLTO', 'VMC', 'VRSK', 'VRSN', 'VRTX', 'VST', 'VTR', 'VTRS', 'VZ', 'WAB', 'WAT', 'WBD', 'WCN', 'WDC', 'WEC', 'WELL', 'WFC', 'WM', 'WMB', 'WMT', 'WRB', 'WST', 'WY', 'WYNN', 'XEL', 'XOM', 'XRAY', 'XYL', 'YUM',
-            'ZBH', 'ZBRA', 'ZTS' ]
-
-        equity_data = yf.download(sp500_tickers, start=start_date, end=end_date)['Close']
-
-        equity_data.to_csv('equity_data.csv')
-
-    # Cryptos
-    def import_cryptos(start_date, end_date):
-        crypto_tickers = [
-            # --- Top Tier (High Market Cap & Volume) ---
-            'BTC-USD',  # Bitcoin
-            'ETH-USD',  # Ethereum
-            'BNB-USD',  # BNB (Binance Coin)
-            'SOL-USD',  # Solana
-            'XRP-USD',  # XRP
-            'DOGE-USD',  # Dogecoin
-            'ADA-USD',  # Cardano
-            'AVAX-USD',  # Avalanche
-            'DOT-USD',  # Polkadot
-            'LINK-USD',  # Chainlink
-
-            # --- Other High-Volume/Major Ecosystem Coins ---
-            'TRX-USD',  # TRON
-            'LTC-USD',  # Litecoin
-            'BCH-USD',  # Bitcoin Cash
-            'XLM-USD',  # Stellar
-            'SHIB-USD',  # Shiba Inu
-            'TON-USD',  # Toncoin
-            'ICP-USD',  # Internet Computer
-            'NEAR-USD',  # NEAR Protocol
-            'XMR-USD',  # Monero
-            'VET-USD',  # VeChain
-            'ATOM-USD',  # Cosmos
-            'DASH-USD',  # Dash
-            'ZEC-USD',  # Zcash
-
-            # --- DeFi, Gaming, and Web3 Majors ---
-            'AAVE-USD',  # Aave
-            'FIL-USD',  # Filecoin
-            'ETC-USD',  # Ethereum Classic
-        ]
-
-        crypto_data = yf.download(crypto_tickers, start=start_date, end=end_date)['Close']
-        crypto_data = crypto_data.reset_index()
-
-        # Clean crypto to adjust trading days
-        crypto_data['Date'] = pd.to_datetime(crypto_data['Date'])
-        crypto_data = crypto_data.set_index('Date')
-
-        # Load equity data to match dates
-        equity_data = pd.read_csv('equity_data.csv')
-        equity_data['Date'] = pd.to_datetime(equity_data['Date'])
-        crypto_data = crypto_data.loc[crypto_data.index.isin(equity_data['Date'])]
-
-        crypto_data.to_csv('cryptos_data.csv')
-
-    # Commodities
-    def import_commodities(start_date, end_date):
-        commodity_tickers = [
-            # Energy
-            'CL=F',  # WTI Crude Oil
-            'BZ=F',  # Brent Crude Oil
-            'NG=F',  # Natural Gas
-            'HO=F',  # Heating Oil
-            'RB=F',  # RBOB Gasoline
-
-            # Precious Metals
-            'GC=F',  # Gold
-            'SI=F',  # Silver
-            'PL=F',  # Platinum
-            'PA=F',  # Palladium
-
-            # Industrial Metals
-            'HG=F',  # Copper
-            'ALI=F',  # Aluminum
-            'TIO=F',  # Iron Ore
-
-            # Agriculture
-            'ZC=F',  # Corn
-            'ZS=F',  # Soybeans
-            'ZW=F',  # Wheat
-
-            # Softs
-            'KC=F',  # Coffee
-            'SB=F',  # Sugar
-            'CC=F',  # Cocoa
-            'CT=F',  # Cotton
-            'OJ=F',  # Frozen Concentrated Orange Juice
-
-            # Livestock
-            'LE=F',  # Live Cattle
-            'HE=F',  # Lean Hogs
-            'GF=F',  # Feeder Cattle
-        ]
-
-        commodities_data = yf.download(commodity_tickers, start=start_date, end=end_date)['Close']
-        commodities_data.to_csv('commodities_data.csv')
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-    # ETF Bonds
-    def import_bonds(start_date, end_date):
-        agg_close = yf.download('AGG', start_date, end_date)['Close']
-        agg_close.to_csv('bonds_data.csv')
+    # Batched, concurrent and retrying downloads shared by the full and incremental imports
+    if source is None:
+        source = ii.YFinanceSource()
+    scheduler = ds.DownloadScheduler(source, batch_size=50, max_workers=download_workers, rate=2)
 
-    import_equity(start_date=start, end_date=end)
-    import_cryptos(start_date=start, end_date=end)
-    import_commodities(start_date=start, end_date=end)
-    import_bonds(start_date=start, end_date=end)
+    def import_prices(start_date, end_date):
+        """Download every price dataset, each one is saved as soon as its last batch is in"""
+        jobs = {
+            'equity_data': sorted(EQUITY_TICKERS),
+            'cryptos_data': sorted(CRYPTO_TICKERS),
+            'commodities_data': sorted(COMMODITY_TICKERS),
+            'bonds_data': BOND_TICKERS,
+        }
 
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+        def store_prices(name, prices):
+            # Cryptos are saved once the equity trading days are known
+            if name != 'cryptos_data':
+                ii.save_dataset(prices, name, BASE_DIR)
 
-    equity_data = pd.read_csv(BASE_DIR + "/equity_data.csv")
-    commodity_data = pd.read_csv(BASE_DIR + "/commodities_data.csv")
-    crypto_data = pd.read_csv(BASE_DIR + "/cryptos_data.csv")
-    bonds_data = pd.read_csv(BASE_DIR + "/bonds_data.csv")
+        downloaded = scheduler.run(jobs, start_date, end_date, on_complete=store_prices)
 
-    equity_data_esg = ut.equity_to_esg(equity_data)
-    commodity_data_esg = ut.commodity_to_esg(commodity_data)
-
-    equity_data_esg.to_csv(BASE_DIR + "/equity_data_esg.csv")
-    commodity_data_esg.to_csv(BASE_DIR + "/commodity_data_esg.csv")
+        # Clean crypto to adjust trading days
+        crypto_data = downloaded['cryptos_data']
+        crypto_data = crypto_data.loc[crypto_data.index.isin(downloaded['equity_data'].index)]
+        ii.save_dataset(crypto_data, 'cryptos_data', BASE_DIR)
 
-    # Compute daily returns
-    equity_returns = ut.dailyreturns(equity_data)
-    equity_esg_returns = ut.dailyreturns(equity_data_esg)
-    commodity_returns = ut.dailyreturns(commodity_data)
-    commodity_esg_returns = ut.dailyreturns(commodity_data_esg)
-    crypto_returns = ut.dailyreturns(crypto_data)
-    bonds_returns = ut.dailyreturns(bonds_data)
+        download_time = sum(timing['seconds'] for timing in scheduler.timings)
+        print(f"{len(scheduler.timings)} requests, {download_time:.1f}s of download time")
 
-    # Save returns as CSV
-    equity_returns.to_csv(BASE_DIR + "/equity_returns.csv")
-    equity_esg_returns.to_csv(BASE_DIR + "/equity_esg_returns.csv")
-    commodity_returns.to_csv(BASE_DIR + "/commodity_returns.csv")
-    commodity_esg_returns.to_csv(BASE_DIR + "/commodity_esg_returns.csv")
-    crypto_returns.to_csv(BASE_DIR + "/crypto_returns.csv")
-    bonds_returns.to_csv(BASE_DIR + "/bonds_returns.csv")
+    # First date added or filled in each price dataset by an incremental import
+    first_changes = {}
+    if incremental:
+        # Only request the dates missing since the last import (see import_manifest.json)
+        universes = [
+            {'prices': 'equity_data', 'tickers': EQUITY_TICKERS},
+            {'prices': 'cryptos_data', 'tickers': CRYPTO_TICKERS, 'calendar': 'equity_data'},
+            {'prices': 'commodities_data', 'tickers': COMMODITY_TICKERS},
+            {'prices': 'bonds_data', 'tickers': BOND_TICKERS},
+        ]
+        updated = ii.update_all_prices(universes, scheduler, start, end, BASE_DIR)
+        first_changes = {name: first_new for name, (_, first_new) in updated.items()}
+    else:
+        import_prices(start_date=start, end_date=end)
 
 
     # Com^pute ERC weights
-    def portfolio_risk(weights, cov_matrix):
-        """Calculate the portfolio risk (standard deviation)"""
-        return np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
-    
-    def risk_contribution(weights, cov_matrix):
-        """Calculate the risk contribution of each asset in the portfolio"""
-        portfolio_std = portfolio_risk(weights, cov_matrix)
-        # Marginal contribution to risk
-        marginal_contribution = np.dot(cov_matrix, weights) / portfolio_std
-        # Risk contribution
-        risk_contrib = weights * marginal_contribution
-        return risk_contrib
-    
-    def objective_function(weights, cov_matrix):
-        """Minimize function to equalize risk contributions"""
-        risk_contribs = risk_contribution(weights, cov_matrix)
-        # We want all risk contributions to be equal, so minimize the sum of squared differences
-        # from the average risk contribution.
-        return np.sum((risk_contribs - np.mean(risk_contribs))**2) * 1000
-    
-    def compute_erc_weights(returns, output_file='erc_weights.csv', risk_contrib_file='erc_risk_contributions.csv'):
+    erc_years = range(2016, 2025)
+
+    def export_erc_weights(results, output_file, risk_contrib_file):
         """
-        Compute ERC weights for each year and export to CSV
-        Also saves risk contributions to a separate CSV file
+        Build the weights / risk contributions tables from the yearly results and export to CSV
+        results: list of (year, weights, risk contributions) in year order
         """
         weights_data = []
         risk_contrib_data = []
-        
-        # Iterate through the years from 2016 to 2024
-        for year in range(2016, 2025):
-            print(f"Computing weights for year {year}...")
-            
-            # Filter data for the current year
-            daily_returns_year = returns.loc[returns.index.year == year]
-            
-            # Drop columns with any NaN values in this year
-            daily_returns_year = daily_returns_year.dropna(axis=1)
-            
-            # Store the column names for the current year
-            columns = daily_returns_year.columns.tolist()
-            
-            # Calculate covariance matrix
-            covariance_matrix_year = daily_returns_year.cov()
-            
-            # Calculate ERC weights for the current year
-            num_assets_year = len(covariance_matrix_year.columns)
-            initial_weights_year = np.array(num_assets_year * [1. / num_assets_year])
-            constraints_year = ({'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1})
-            bounds_year = tuple((0, 1) for asset in range(num_assets_year))
-            options = {'ftol': 1e-10, 'maxiter': 1000}
-            
-            result_year = minimize(objective_function, initial_weights_year, 
-                                  args=(covariance_matrix_year,),
-                                  method='SLSQP', bounds=bounds_year, 
-                                  constraints=constraints_year,
-                                  options=options, tol=1e-10)
-            
-            erc_weights_year = result_year.x
-            
-            # Check the risk contributions for the optimized ERC weights
-            erc_risk_contributions = risk_contribution(erc_weights_year, covariance_matrix_year)
-            
-            erc_risk_contributions_df = pd.DataFrame({'Risk Contribution': erc_risk_contributions}, index=covariance_matrix_year.columns)
-            
+
+        for year, erc_weights_year, erc_risk_contributions in results:
             # Store weights with asset names
             weight_dict = {'year': year}
-            for asset, weight in zip(columns, erc_weights_year):
-                weight_dict[asset] = weight
-            
+            weight_dict.update(erc_weights_year.to_dict())
             weights_data.append(weight_dict)
-            
+
             # Store risk contributions with asset names
             risk_contrib_dict = {'year': year}
-            for asset, risk_contrib in zip(columns, erc_risk_contributions):
-                risk_contrib_dict[asset] = risk_contrib
-            
+            risk_contrib_dict.update(erc_risk_contributions.to_dict())
             risk_contrib_data.append(risk_contrib_dict)
-        
+
         # Create DataFrames
         weights_df = pd.DataFrame(weights_data)
         risk_contrib_df = pd.DataFrame(risk_contrib_data)
-        
+
         # Export to CSV
         weights_df.to_csv(output_file, index=False)
         print(f"\nWeights exported to {output_file}")
-        
+
         risk_contrib_df.to_csv(risk_contrib_file, index=False)
         print(f"Risk contributions exported to {risk_contrib_file}")
-        
+
         return weights_df, risk_contrib_df
-    
-    
-    weights_eq, risk_contrib_eq = compute_erc_weights(equity_returns, output_file='erc_weights_equity.csv', risk_contrib_file='erc_risk_contributions_equity.csv')
-    weights_eqesg, risk_contrib_eqesg = compute_erc_weights(equity_esg_returns, output_file='erc_weights_equity_esg.csv', risk_contrib_file='erc_risk_contributions_equity_esg.csv')
-    weights_com, risk_contrib_com = compute_erc_weights(commodity_returns, output_file='erc_weights_commodity.csv', risk_contrib_file='erc_risk_contributions_commodity.csv')
-    weights_comseg, risk_contrib_comseg = compute_erc_weights(commodity_esg_returns, output_file='erc_weights_commodity_esg.csv', risk_contrib_file='erc_risk_contributions_commodity_esg.csv')
-    weights_crypto, risk_contrib_crypto = compute_erc_weights(crypto_returns, output_file='erc_weights_crypto.csv', risk_contrib_file='erc_risk_contributions_crypto.csv')
 
-importer_data(start='2016-01-01',end='2025-11-01')
+    def compute_erc_weights(returns, output_file='erc_weights.csv', risk_contrib_file='erc_risk_contributions.csv',
+                            method='newton', warm_start=True):
+        """
+        Compute ERC weights for each year and export to CSV
+        Also saves risk contributions to a separate CSV file
+        method: 'newton' or 'ccd' (cyclical coordinate descent)
+        warm_start: start each year from the previous year's weights (inverse volatility otherwise)
+        """
+        results = []
+        previous_weights = None
+
+        # Iterate through the years from 2016 to 2024
+        for year in erc_years:
+            print(f"Computing weights for year {year}...")
+
+            # Filter data for the current year
+            daily_returns_year = returns.loc[returns.index.year == year]
+
+            # Seed with last year's weights, assets new to the universe get inverse volatility weights
+            initial_weights_year = None
+            if warm_start and previous_weights is not None:
+                initial_weights_year = previous_weights
+
+            erc_weights_year, erc_risk_contributions, residual_year = es.erc_year(
+                daily_returns_year, method=method, initial_weights=initial_weights_year)
+            previous_weights = erc_weights_year
+            print(f"  ERC residual for year {year}: {residual_year:.2e}")
+
+            results.append((year, erc_weights_year, erc_risk_contributions))
+
+        return export_erc_weights(results, output_file, risk_contrib_file)
+
+    def compute_erc_weights_parallel(universes, method='newton', max_workers=None, executor=None):
+        """
+        Compute the ERC weights of several universes with every (universe, year) solve
+        submitted to a process pool, then export each universe as compute_erc_weights does.
+        universes: list of (returns, output_file, risk_contrib_file)
+        executor: optional process pool to submit to (shared by concurrent callers), a pool
+                  of max_workers processes is created otherwise
+        Every solve starts from inverse volatility weights so the output does not depend
+        on the number of workers or on the completion order
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+                return compute_erc_weights_parallel(universes, method, executor=executor)
+
+        futures = {}
+        for u, (returns, output_file, risk_contrib_file) in enumerate(universes):
+            for year in erc_years:
+                daily_returns_year = returns.loc[returns.index.year == year]
+                futures[(u, year)] = executor.submit(es.erc_year, daily_returns_year, method)
+
+        outputs = []
+        for u, (returns, output_file, risk_contrib_file) in enumerate(universes):
+            results = []
+            for year in erc_years:
+                erc_weights_year, erc_risk_contributions, residual_year = futures[(u, year)].result()
+                print(f"ERC residual for {output_file}, year {year}: {residual_year:.2e}")
+                results.append((year, erc_weights_year, erc_risk_contributions))
+            outputs.append(export_erc_weights(results, output_file, risk_contrib_file))
+
+        return outputs
+
+    # Everything downstream of the prices is a stage of the pipeline, skipped when
+    # its inputs and parameters have not changed since its last run
+    pipeline = pl.Pipeline(BASE_DIR)
+
+    # Daily returns of the base panels, screened universes (ESG) are masks over them
+    def add_returns_stage(name, prices_name):
+        def run():
+            prices = rs.load_returns(prices_name, data_dir=BASE_DIR)
+            if prices_name in first_changes:
+                # Only the returns of the new rows are computed when the prices just grew
+                ii.append_returns(prices, f"{name}_returns", first_changes[prices_name], BASE_DIR)
+            else:
+                ii.save_dataset(ut.dailyreturns(prices), f"{name}_returns", BASE_DIR)
+        pipeline.add(f"returns_{name}", run, inputs=[f"{prices_name}.parquet"], outputs=[f"{name}_returns.parquet"])
+
+    price_datasets = {
+        'equity': 'equity_data',
+        'commodity': 'commodities_data',
+        'crypto': 'cryptos_data',
+        'bonds': 'bonds_data',
+    }
+    for name, prices_name in price_datasets.items():
+        add_returns_stage(name, prices_name)
+
+    # Consolidated memory-mapped return cube (dates x all tickers)
+    pipeline.add('return_cube', lambda: rc.build_return_cube(BASE_DIR),
+                 inputs=[f"{name}_returns.parquet" for name in price_datasets],
+                 outputs=[rc.CUBE_FILE, rc.INDEX_FILE],
+                 params={'screens': sc.load_screens()})
+
+    # ERC weights, and the persisted ERC backtests extended with the trading days added since the last refresh
+    erc_names = ['equity', 'equity_esg', 'commodity', 'commodity_esg', 'crypto']
+
+    def add_erc_stages(name):
+        asset_class, screen = rc.UNIVERSES[name]
+        excluded = [] if screen is None else sc.exclusions(asset_class, screen)
+        weights_file = f"erc_weights_{name}.csv"
+        risk_contrib_file = f"erc_risk_contributions_{name}.csv"
+        state_file = f"erc_backtest_state_{name}.pkl"
+
+        def load_universe():
+            returns = rs.load_returns(f"{asset_class}_returns", data_dir=BASE_DIR)
+            return returns, None if screen is None else sc.screen_mask(returns.columns, asset_class, screen)
+
+        def run_erc():
+            returns, mask = load_universe()
+            if mask is not None:
+                returns = returns.loc[:, mask]
+            if parallel:
+                compute_erc_weights_parallel([(returns, BASE_DIR + "/" + weights_file, BASE_DIR + "/" + risk_contrib_file)],
+                                             executor=erc_pool)
+            else:
+                compute_erc_weights(returns, output_file=BASE_DIR + "/" + weights_file,
+                                    risk_contrib_file=BASE_DIR + "/" + risk_contrib_file)
+
+        def run_backtest():
+            returns, mask = load_universe()
+            new_returns, (mean, vol, sharpe, cumu) = ib.extend_erc_backtest(
+                returns, BASE_DIR + "/" + state_file, mask=mask, weights_file=BASE_DIR + "/" + weights_file)
+            print(f"ERC backtest {name}: {len(new_returns)} new days, return {mean:.2%}, volatility {vol:.2%}, "
+                  f"Sharpe {sharpe:.2f}, cumulative {cumu:.2%}")
+
+        pipeline.add(f"erc_{name}", run_erc, inputs=[f"{asset_class}_returns.parquet"],
+                     outputs=[weights_file, risk_contrib_file],
+                     params={'years': list(erc_years), 'method': 'newton', 'warm_start': not parallel,
+                             'excluded': excluded})
+        pipeline.add(f"erc_backtest_{name}", run_backtest, inputs=[f"{asset_class}_returns.parquet", weights_file],
+                     outputs=[state_file], params={'excluded': excluded})
+
+    for name in erc_names:
+        add_erc_stages(name)
+
+    # Precompute the mean-variance results served by the portfolio page
+    pipeline.add('meanvar_lookup', lambda: mvl.build_meanvar_lookup(BASE_DIR),
+                 inputs=[rc.CUBE_FILE, rc.INDEX_FILE] + [f"erc_weights_{name}.csv" for name in erc_names],
+                 outputs=['meanvar_lookup.npz'])
+
+    if not parallel:
+        return pipeline.run(force=force)
+
+    # The stale ERC stages run at the same time and share one process pool, so every
+    # (universe, year) solve of the refresh is in flight at once
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as erc_pool:
+        return pipeline.run(force=force, max_workers=len(erc_names))
+
 
+if __name__ == '__main__':
+    importer_data(start='2016-01-01',end='2025-11-01')
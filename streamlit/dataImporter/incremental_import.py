@@ -0,0 +1,230 @@
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+import utils.utilities as ut
+import dataImporter.return_store as rs
+
+
+# Incremental price import: for every ticker the manifest records the last date with a price
+# (high-water mark); a refresh only requests the gap after it, appends the new prices and
+# computes returns for the new rows only.
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_FILE = 'import_manifest.json'
+
+
+class YFinanceSource:
+    """
+    Close prices downloaded from Yahoo Finance, one Ticker.history request per ticker.
+    yf.download is avoided: it resets and reads module globals (shared._DFS, shared._ERRORS) on
+    every call, so concurrent batches would mix up their results. Ticker.history keeps its data
+    on the Ticker object (it only records its own ticker's error in shared._ERRORS), so the
+    batches of DownloadScheduler can run on several threads without a lock.
+    A ticker whose request fails is left out of the frame (the scheduler retries it); the batch
+    raises only when every ticker failed
+    """
+
+    def fetch(self, tickers, start, end):
+        import yfinance as yf
+
+        closes, errors = {}, []
+        for ticker in tickers:
+            try:
+                history = yf.Ticker(ticker).history(start=start, end=end, auto_adjust=False, raise_errors=True)
+            except Exception as e:
+                errors.append(f"{ticker}: {e}")
+                continue
+            if len(history) > 0:
+                # Same dates as yf.download: exchange-local trading days without time zone
+                dates = pd.DatetimeIndex(history.index).tz_localize(None).normalize()
+                closes[ticker] = pd.Series(history['Close'].values, index=dates)
+
+        if errors and not closes:
+            raise ConnectionError('; '.join(errors))
+        prices = pd.DataFrame(closes, columns=[t for t in tickers if t in closes])
+        prices.index = pd.DatetimeIndex(prices.index, name='Date')
+        return prices.sort_index()
+
+
+class FixtureSource:
+    """
+    Close prices served from a local DataFrame (dates x tickers), e.g. a stored price file.
+    Stands in for YFinanceSource in tests and offline runs
+    failures: optional {ticker: number of requests that raise before it is served}
+    latency: seconds each request takes
+    """
+
+    def __init__(self, prices, failures=None, latency=0.):
+        self.prices = prices
+        self.failures = dict(failures or {})
+        self.latency = latency
+        self.requests = []
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_csv(cls, *price_files):
+        frames = [rs.load_returns(Path(f).stem, data_dir=str(Path(f).parent)) for f in price_files]
+        return cls(pd.concat(frames, axis=1))
+
+    def fetch(self, tickers, start, end):
+        with self.lock:
+            self.requests.append((tuple(tickers), pd.Timestamp(start), pd.Timestamp(end)))
+            failing = [t for t in tickers if self.failures.get(t, 0) > 0]
+            for t in failing:
+                self.failures[t] -= 1
+        if self.latency:
+            time.sleep(self.latency)
+        if failing:
+            raise ConnectionError(f"fixture failure for {', '.join(failing)}")
+        rows = (self.prices.index >= pd.Timestamp(start)) & (self.prices.index < pd.Timestamp(end))
+        return self.prices.loc[rows, [t for t in tickers if t in self.prices.columns]].dropna(how='all')
+
+
+def load_manifest(data_dir=DATA_DIR):
+    manifest_file = os.path.join(data_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, data_dir=DATA_DIR):
+    with open(os.path.join(data_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def load_stored(name, data_dir=DATA_DIR):
+    """Stored dataset indexed by date, None if it does not exist yet"""
+    try:
+        return rs.load_returns(name, data_dir=data_dir)
+    except FileNotFoundError:
+        return None
+
+
+def save_dataset(df, name, data_dir=DATA_DIR):
+    """Write a dataset as CSV (export) and Parquet (read by the app)"""
+    df.to_csv(os.path.join(data_dir, f"{name}.csv"))
+    rs.write_dataset(df, name, data_dir)
+
+
+def high_water_marks(prices, tickers, manifest_entry):
+    """Last date with a price for each ticker, from the manifest or the stored prices"""
+    marks = {}
+    for ticker in tickers:
+        if ticker in manifest_entry:
+            marks[ticker] = pd.Timestamp(manifest_entry[ticker])
+        elif prices is not None and ticker in prices.columns and prices[ticker].notna().any():
+            marks[ticker] = prices[ticker].last_valid_index()
+        else:
+            marks[ticker] = None
+    return marks
+
+
+def update_prices(name, tickers, source, start, end, manifest, calendar=None, data_dir=DATA_DIR):
+    """
+    Bring the stored prices <name> up to `end` (exclusive), requesting only each ticker's gap.
+    Tickers sharing a high-water mark are fetched in one request.
+    calendar: optional dates the rows are restricted to (cryptos follow the equity trading days)
+    Returns the updated prices and the first date whose prices were added or filled
+    (None if nothing was added): before the last stored date when the stored history changed
+    """
+    prices = load_stored(name, data_dir)
+    marks = high_water_marks(prices, tickers, manifest.get(name, {}))
+
+    # 1. Group the tickers by the first date they are missing
+    gaps = {}
+    for ticker, mark in marks.items():
+        gap_start = pd.Timestamp(start) if mark is None else mark + pd.Timedelta(days=1)
+        if gap_start < pd.Timestamp(end):
+            gaps.setdefault(gap_start, []).append(ticker)
+
+    # 2. Fetch the gaps
+    fetched = []
+    for gap_start, gap_tickers in sorted(gaps.items()):
+        print(f"{name}: fetching {len(gap_tickers)} tickers from {gap_start.date()}")
+        new_prices = source.fetch(gap_tickers, gap_start, end)
+        if calendar is not None:
+            new_prices = new_prices.loc[new_prices.index.isin(calendar)]
+        fetched.append(new_prices.dropna(how='all'))
+    fetched = [f for f in fetched if len(f) > 0]
+    if not fetched:
+        return prices, None
+
+    # Each ticker is in a single gap, so the fetched frames have distinct columns
+    new_prices = pd.concat(fetched, axis=1).sort_index()
+
+    # 3. Append: new dates become new rows, missing prices inside the stored history are filled
+    first_new = new_prices.index[0]
+    if prices is None:
+        prices = new_prices
+    else:
+        columns = list(prices.columns) + [t for t in new_prices.columns if t not in prices.columns]
+        prices = prices.combine_first(new_prices)[columns]
+    prices.index.name = 'Date'
+
+    save_dataset(prices, name, data_dir)
+    manifest[name] = {
+        ticker: str(prices[ticker].last_valid_index().date())
+        for ticker in prices.columns if prices[ticker].notna().any()
+    }
+    return prices, first_new
+
+
+def append_returns(prices, name, first_new, data_dir=DATA_DIR):
+    """
+    Append to the stored returns <name> the returns of the price rows from first_new on.
+    Same values as ut.dailyreturns(prices) (forward filled prices) without recomputing the history.
+    The returns are recomputed in full when there are no stored returns, or when they do not end
+    on the last price date before first_new (the stored price history changed or the returns are stale)
+    """
+    returns = load_stored(name, data_dir)
+    history = prices if first_new is None else prices.loc[prices.index < first_new]
+    if returns is None or len(returns) == 0 or len(history) == 0 or returns.index[-1] != history.index[-1]:
+        print(f"{name}: recomputing the returns over the full history")
+        returns = ut.dailyreturns(prices)
+    elif first_new is not None:
+        # Last known price of every ticker before the new rows anchors the first new return
+        anchor = history.ffill().iloc[[-1]]
+        new_rows = pd.concat([anchor, prices.loc[prices.index >= first_new]])
+        new_returns = new_rows.ffill().pct_change(fill_method=None).iloc[1:]
+        returns = pd.concat([returns, new_returns])
+    else:
+        return returns
+
+    returns.index.name = 'Date'
+    save_dataset(returns, name, data_dir)
+    return returns
+
+
+def update_all_prices(universes, source, start, end, data_dir=DATA_DIR):
+    """
+    Incremental refresh of the price datasets of several universes, in order.
+    universes: list of dicts with 'prices' (dataset name), 'tickers' and an optional 'calendar'
+    (price dataset whose dates restrict the rows, listed before)
+    Returns {price dataset name: (prices, first new date)}
+    """
+    manifest = load_manifest(data_dir)
+    updated = {}
+
+    for universe in universes:
+        calendar = None
+        if universe.get('calendar') is not None:
+            calendar_prices = updated[universe['calendar']][0]
+            if calendar_prices is None:
+                print(f"{universe['prices']}: no {universe['calendar']} prices yet, rows not restricted to its dates")
+            else:
+                calendar = calendar_prices.index
+
+        updated[universe['prices']] = update_prices(universe['prices'], universe['tickers'], source, start, end,
+                                                    manifest, calendar=calendar, data_dir=data_dir)
+
+    save_manifest(manifest, data_dir)
+    return updated
+
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# Data pipeline as named stages with declared input and output files.
+# Every stage is stamped with a content hash of its input files and parameters; when the
+# hash matches the stamp of the last run and the outputs exist, the stage is skipped.
+# Outputs that come out byte-identical keep the downstream stages skipped as well.
+# Independent stages can run concurrently (see Pipeline.run).
+
+STAMP_FILE = 'pipeline_stamps.json'
+
+
+class Stage:
+    """
+    name: unique stage name
+    func: callable without arguments that reads the inputs and writes the outputs
+    inputs, outputs: file names relative to the pipeline data directory
+    params: JSON-serializable parameters that change the outputs (e.g. an exclusion list)
+    """
+
+    def __init__(self, name, func, inputs=(), outputs=(), params=None):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params if params is not None else {}
+
+
+def file_hash(path):
+    """sha1 of a file's content, None if the file does not exist"""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """
+    Stages run in dependency order (a stage depends on the stages producing its inputs).
+    data_dir: directory of the input / output files and of the stamp file
+    """
+
+    def __init__(self, data_dir, stamp_file=STAMP_FILE):
+        self.data_dir = data_dir
+        self.stamp_file = os.path.join(data_dir, stamp_file)
+        self.stages = {}
+
+    def add(self, name, func, inputs=(), outputs=(), params=None):
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already defined")
+        self.stages[name] = Stage(name, func, inputs, outputs, params)
+        return self.stages[name]
+
+    def path(self, file_name):
+        return os.path.join(self.data_dir, file_name)
+
+    def producers(self):
+        """Output file -> name of the stage writing it"""
+        producers = {}
+        for stage in self.stages.values():
+            for output in stage.outputs:
+                if output in producers:
+                    raise ValueError(f"{output} is written by both {producers[output]} and {stage.name}")
+                producers[output] = stage.name
+        return producers
+
+    def dependencies(self):
+        """Stage name -> names of the stages it depends on"""
+        producers = self.producers()
+        return {
+            stage.name: sorted({producers[i] for i in stage.inputs if i in producers} - {stage.name})
+            for stage in self.stages.values()
+        }
+
+    def order(self):
+        """Stage names in dependency order (stages keep their insertion order when independent)"""
+        dependencies = self.dependencies()
+        ordered, done = [], set()
+        while len(ordered) < len(self.stages):
+            ready = [name for name in self.stages if name not in done and set(dependencies[name]) <= done]
+            if not ready:
+                raise ValueError(f"Cycle between stages {sorted(set(self.stages) - done)}")
+            for name in ready:
+                ordered.append(name)
+                done.add(name)
+        return ordered
+
+    def fingerprint(self, stage):
+        """Hash of the stage name, parameters and input file contents"""
+        digest = hashlib.sha1()
+        digest.update(stage.name.encode())
+        digest.update(json.dumps(stage.params, sort_keys=True, default=str).encode())
+        for file_name in stage.inputs:
+            digest.update(file_name.encode())
+            digest.update(str(file_hash(self.path(file_name))).encode())
+        return digest.hexdigest()
+
+    def load_stamps(self):
+        if not os.path.exists(self.stamp_file):
+            return {}
+        with open(self.stamp_file) as f:
+            return json.load(f)
+
+    def save_stamps(self, stamps):
+        with open(self.stamp_file, 'w') as f:
+            json.dump(stamps, f, indent=1, sort_keys=True)
+
+    def is_current(self, stage, fingerprint, stamps):
+        return stamps.get(stage.name) == fingerprint and all(os.path.exists(self.path(o)) for o in stage.outputs)
+
+    def run_stage(self, stage, stamps, force=False):
+        """Run a stage unless it is up to date, returns True if it ran"""
+        fingerprint = self.fingerprint(stage)
+        if not force and self.is_current(stage, fingerprint, stamps):
+            print(f"{stage.name}: unchanged, skipped")
+            return False
+
+        started = time.perf_counter()
+        stage.func()
+        stamps[stage.name] = fingerprint
+        print(f"{stage.name}: done in {time.perf_counter() - started:.2f}s")
+        return True
+
+    def run(self, force=False, max_workers=1):
+        """
+        Run the stages that are out of date.
+        force: rerun every stage (e.g. after a code change the hashes cannot see)
+        max_workers: stages running at once on a thread pool, a stage starts as soon as the stages
+                     it depends on are done (1 runs them one after the other in dependency order)
+        Returns the names of the stages that ran
+        """
+        stamps = self.load_stamps()
+        ran = []
+        if not max_workers or max_workers <= 1:
+            for name in self.order():
+                if self.run_stage(self.stages[name], stamps, force=force):
+                    ran.append(name)
+                    # Save after every stage so an interrupted run keeps its progress
+                    self.save_stamps(stamps)
+            return ran
+
+        order = self.order()
+        dependencies = self.dependencies()
+        finished, running = set(), {}
+
+        def run_one(stage, stamp):
+            # Each stage gets its own stamp dict, only this thread merges them into stamps
+            stage_stamps = {stage.name: stamp} if stamp is not None else {}
+            return self.run_stage(stage, stage_stamps, force=force), stage_stamps.get(stage.name)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage') as executor:
+            while len(finished) < len(order):
+                for name in order:
+                    if name not in finished and name not in running.values() and set(dependencies[name]) <= finished:
+                        running[executor.submit(run_one, self.stages[name], stamps.get(name))] = name
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    stage_ran, stamp = future.result()
+                    finished.add(name)
+                    if stage_ran:
+                        ran.append(name)
+                        stamps[name] = stamp
+                        self.save_stamps(stamps)
+        return ran
@@ -0,0 +1,230 @@
+import os
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+import dataImporter.return_store as rs
+import utils.screens as sc
+
+
+# Dense on-disk "return cube": one float64 block (dates x tickers) per asset class, stored one
+# after the other in a single file and memory-mapped with np.memmap, and a small sidecar index
+# (.npz) with each block's trading days and offset, the tickers, their asset class, screen masks
+# and availability range.
+# Every asset class keeps its own date axis, so its full history is a contiguous block of rows.
+# Columns are grouped by asset class with the tickers kept by the ESG screen first, so every
+# universe (and its ESG subset) is a contiguous block of columns: a universe over any date range
+# is a zero-copy view of the mapped file. Other screens are masks over the same columns.
+# Every process maps the same file and shares one page-cache copy.
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+CUBE_FILE = 'return_cube.dat'
+INDEX_FILE = 'return_cube_index.npz'
+
+ASSET_CLASSES = ['equity', 'commodity', 'crypto', 'bonds']
+
+# Universe name -> (asset class, screen or None)
+UNIVERSES = {
+    'equity': ('equity', None),
+    'equity_esg': ('equity', 'esg'),
+    'commodity': ('commodity', None),
+    'commodity_esg': ('commodity', 'esg'),
+    'crypto': ('crypto', None),
+    'bonds': ('bonds', None),
+}
+
+# Screen whose kept tickers are stored first in each asset class
+PRIMARY_SCREEN = 'esg'
+
+
+def build_return_cube(data_dir=DATA_DIR):
+    """
+    Write the return cube and its index from the <asset class>_returns datasets in data_dir.
+    Asset classes without a returns dataset are left out
+    """
+    screens = sc.load_screens()
+
+    frames = {}
+    for asset_class in ASSET_CLASSES:
+        try:
+            frames[asset_class] = rs.load_returns(f"{asset_class}_returns", data_dir=data_dir)
+        except FileNotFoundError:
+            print(f"No returns for {asset_class}, skipped")
+            continue
+
+    # 1. Column layout (ESG-kept tickers first within each class)
+    tickers, classes = [], []
+    for asset_class, frame in frames.items():
+        kept = sc.screen_mask(frame.columns, asset_class, PRIMARY_SCREEN)
+        tickers += list(frame.columns[kept]) + list(frame.columns[~kept])
+        classes += [asset_class] * len(frame.columns)
+
+    screen_masks = np.zeros((len(screens), len(tickers)), dtype=bool)
+    for s, screen in enumerate(screens):
+        for asset_class in frames:
+            in_class = np.array(classes) == asset_class
+            screen_masks[s, in_class] = sc.screen_mask(np.array(tickers)[in_class], asset_class, screen)
+
+    # 2. One block per asset class on its own trading days (NaN where a ticker has no return)
+    first_row = np.full(len(tickers), -1)
+    last_row = np.full(len(tickers), -1)
+    offsets, date_counts, dates = [], [], []
+    offset = 0
+    with open(os.path.join(data_dir, CUBE_FILE), 'wb') as f:
+        for asset_class, frame in frames.items():
+            columns = [t for t, c in zip(tickers, classes) if c == asset_class]
+            values = np.asfortranarray(frame[columns].values, dtype=np.float64)
+            f.write(values.tobytes(order='F'))
+            offsets.append(offset)
+            offset += values.nbytes
+            date_counts.append(len(frame))
+            dates.append(frame.index.values.astype('datetime64[ns]').astype(np.int64))
+
+            # Availability range of every ticker (first and last row of the block with a return)
+            available = ~np.isnan(values)
+            has_data = available.any(axis=0)
+            in_class = np.array(classes) == asset_class
+            first_row[in_class] = np.where(has_data, available.argmax(axis=0), -1)
+            last_row[in_class] = np.where(has_data, len(frame) - 1 - available[::-1].argmax(axis=0), -1)
+
+    np.savez(
+        os.path.join(data_dir, INDEX_FILE),
+        dates=np.concatenate(dates) if dates else np.array([], dtype=np.int64),
+        date_counts=np.array(date_counts, dtype=np.int64),
+        offsets=np.array(offsets, dtype=np.int64),
+        tickers=np.array(tickers),
+        asset_classes=np.array(classes),
+        screen_names=np.array(list(screens)),
+        screen_masks=screen_masks,
+        first_row=first_row,
+        last_row=last_row,
+        class_names=np.array(list(frames)),
+    )
+
+
+class ReturnCube:
+    """
+    Read-only view of the return cube.
+    data_dir: directory holding the cube and its index (see build_return_cube)
+    """
+
+    def __init__(self, data_dir=DATA_DIR):
+        with np.load(os.path.join(data_dir, INDEX_FILE)) as index:
+            self.tickers = index['tickers'].tolist()
+            self.asset_classes = index['asset_classes']
+            self.screens = dict(zip(index['screen_names'].tolist(), index['screen_masks']))
+            self.first_row = index['first_row']
+            self.last_row = index['last_row']
+            class_names = index['class_names'].tolist()
+            date_bounds = np.concatenate(([0], np.cumsum(index['date_counts'])))
+            all_dates = index['dates']
+            offsets = index['offsets']
+
+        # Trading days and mapped block of every asset class
+        self.dates, self.blocks = {}, {}
+        for c, asset_class in enumerate(class_names):
+            self.dates[asset_class] = pd.DatetimeIndex(all_dates[date_bounds[c]:date_bounds[c + 1]], name='Date')
+            num_columns = int((self.asset_classes == asset_class).sum())
+            if len(self.dates[asset_class]) == 0 or num_columns == 0:
+                self.blocks[asset_class] = np.empty((len(self.dates[asset_class]), num_columns))
+                continue
+            self.blocks[asset_class] = np.memmap(os.path.join(data_dir, CUBE_FILE), dtype=np.float64, mode='r',
+                                                 offset=int(offsets[c]), order='F',
+                                                 shape=(len(self.dates[asset_class]), num_columns))
+
+    def has_universe(self, universe):
+        return self.mask(universe).any()
+
+    def mask(self, universe, screen=None):
+        """Boolean mask over the cube columns of an asset class or universe, optionally screened"""
+        asset_class, universe_screen = UNIVERSES.get(universe, (universe, None))
+        mask = self.asset_classes == asset_class
+        for name in [universe_screen, screen]:
+            if name is not None:
+                mask &= self.screens[name]
+        return mask
+
+    def columns(self, universe, screen=None):
+        """
+        Columns of a universe within the cube (global) and within its asset class block: slices
+        when they are contiguous (every universe and its ESG subset), arrays of positions otherwise
+        """
+        asset_class, _ = UNIVERSES.get(universe, (universe, None))
+        positions = np.flatnonzero(self.mask(universe, screen))
+        if len(positions) == 0:
+            return slice(0, 0), slice(0, 0)
+        class_start = np.flatnonzero(self.asset_classes == asset_class)[0]
+        if positions[-1] - positions[0] + 1 == len(positions):
+            return (slice(positions[0], positions[-1] + 1),
+                    slice(positions[0] - class_start, positions[-1] + 1 - class_start))
+        return positions, positions - class_start
+
+    def rows(self, asset_class, start=None, end=None):
+        """Rows of the asset class block within [start, end): always a slice"""
+        dates = self.dates[asset_class]
+        first = 0 if start is None else dates.searchsorted(pd.Timestamp(start))
+        last = len(dates) if end is None else dates.searchsorted(pd.Timestamp(end))
+        return slice(first, last)
+
+    def view(self, universe, screen=None):
+        """(dates x tickers) values of a universe on its class's trading days, zero-copy for contiguous columns"""
+        asset_class, _ = UNIVERSES.get(universe, (universe, None))
+        return self.blocks[asset_class][:, self.columns(universe, screen)[1]]
+
+    def availability(self, universe):
+        """First and last date with a return, per ticker of the universe"""
+        asset_class, _ = UNIVERSES.get(universe, (universe, None))
+        columns = self.columns(universe)[0]
+        dates = self.dates[asset_class]
+        return pd.DataFrame({
+            'first': dates[self.first_row[columns]],
+            'last': dates[self.last_row[columns]],
+        }, index=np.array(self.tickers)[columns])
+
+    def frame(self, universe, start=None, end=None, screen=None):
+        """
+        Returns DataFrame of a universe on the trading days of its asset class.
+        start, end: optional date bounds (inclusive start, exclusive end)
+        screen: optional extra screen applied to the universe
+        The frame wraps the read-only memory map without a copy (any date range, contiguous
+        columns); only a screen selecting scattered columns makes it a private copy.
+        Columns follow the cube layout: within an asset class, the tickers kept by the ESG screen
+        come first, so a universe's column order can differ from its returns dataset
+        """
+        asset_class, _ = UNIVERSES[universe]
+        columns = self.columns(universe, screen)[0]
+        rows = self.rows(asset_class, start, end)
+        return pd.DataFrame(self.view(universe, screen)[rows], index=self.dates[asset_class][rows],
+                            columns=np.array(self.tickers)[columns], copy=False)
+
+
+@lru_cache(maxsize=4)
+def open_return_cube(data_dir, mtime):
+    """Map the cube once per process and file version"""
+    return ReturnCube(data_dir)
+
+
+def load_universe(universe, start=None, end=None, data_dir=DATA_DIR):
+    """
+    Returns of a universe read from the return cube, or from the returns dataset of its
+    asset class (screened) if the cube has not been built or does not hold the universe
+    """
+    index_file = os.path.join(data_dir, INDEX_FILE)
+    if os.path.exists(index_file):
+        cube = open_return_cube(data_dir, os.path.getmtime(index_file))
+        if cube.has_universe(universe):
+            return cube.frame(universe, start=start, end=end)
+
+    asset_class, screen = UNIVERSES[universe]
+    returns = rs.load_returns(f"{asset_class}_returns", start=start, end=end, data_dir=data_dir)
+    if screen is not None:
+        returns = sc.apply_screen(returns, asset_class, screen)
+    return returns
+
+
+if __name__ == '__main__':
+    build_return_cube()
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+# Columnar binary storage of the price / return datasets.
+# Each dataset is a Parquet file with an int64 'Date' column (nanoseconds since epoch)
+# and one float64 column per ticker. The CSV files remain as an export format, the app
+# reads the Parquet files so no text is parsed when a page is rendered.
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def dataset_path(name, data_dir=DATA_DIR):
+    return os.path.join(data_dir, f"{name}.parquet")
+
+
+def write_dataset(df, name, data_dir=DATA_DIR):
+    """
+    Save a dataset indexed by date (or with a 'Date' column) as <name>.parquet
+    """
+    if 'Date' in df.columns:
+        df = df.set_index('Date')
+    dates = pd.to_datetime(df.index).values.astype('datetime64[ns]').astype(np.int64)
+
+    columns = {'Date': pa.array(dates, type=pa.int64())}
+    for column in df.columns:
+        columns[str(column)] = pa.array(df[column].values.astype(np.float64), type=pa.float64())
+
+    pq.write_table(pa.table(columns), dataset_path(name, data_dir))
+
+
+def read_dataset(name, columns=None, start=None, end=None, data_dir=DATA_DIR):
+    """
+    Load a dataset as a DataFrame indexed by date ('Date').
+    columns: optional subset of tickers to read
+    start, end: optional date bounds (inclusive start, exclusive end), applied while reading
+    """
+    filters = []
+    if start is not None:
+        filters.append(('Date', '>=', pd.Timestamp(start).value))
+    if end is not None:
+        filters.append(('Date', '<', pd.Timestamp(end).value))
+
+    table = pq.read_table(
+        dataset_path(name, data_dir),
+        columns=None if columns is None else ['Date'] + list(columns),
+        filters=filters or None,
+    )
+
+    df = table.to_pandas()
+    df.index = pd.DatetimeIndex(pd.to_datetime(df.pop('Date').values), name='Date')
+    return df
+
+
+def load_returns(name, columns=None, start=None, end=None, data_dir=DATA_DIR):
+    """
+    Load a dataset from its Parquet file, falling back to the CSV export if it has not been converted yet
+    """
+    if os.path.exists(dataset_path(name, data_dir)):
+        return read_dataset(name, columns=columns, start=start, end=end, data_dir=data_dir)
+
+    df = pd.read_csv(os.path.join(data_dir, f"{name}.csv"))
+    df = df.drop(columns=[column for column in df.columns if column.startswith('Unnamed')])
+    df = df.set_index(pd.DatetimeIndex(pd.to_datetime(df.pop('Date')), name='Date'))
+    if columns is not None:
+        df = df[list(columns)]
+    if start is not None:
+        df = df[df.index >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df.index < pd.Timestamp(end)]
+    return df
+
+
+def convert_csv_store(data_dir=DATA_DIR):
+    """Write a Parquet copy of every price / return CSV in the data directory"""
+    for file_name in sorted(os.listdir(data_dir)):
+        name, extension = os.path.splitext(file_name)
+        if extension != '.csv' or name.startswith('erc_'):
+            continue
+        df = pd.read_csv(os.path.join(data_dir, file_name))
+        # Some exports carry an unnamed integer index before the 'Date' column
+        df = df.drop(columns=[column for column in df.columns if column.startswith('Unnamed')])
+        df['Date'] = pd.to_datetime(df['Date'])
+        write_dataset(df, name, data_dir)
+        print(f"Converted {file_name} to {name}.parquet")
+
+
+if __name__ == '__main__':
+    convert_csv_store()
@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import os
 import utils.web_util as wu
+import dataImporter.return_store as rs
 from statics import IMG_DIR
 import plotly.graph_objects as go
 import plotly.express as px
@@ -56,8 +57,8 @@ def get_portfolios_cumulative_returns():
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
     # Load portfolio returns (already cumulative based on filenames)
-    portfolio1 = pd.read_csv(BASE_DIR + "/dataImporter/tradi_cumu.csv", index_col=0, parse_dates=True)
-    portfolio2 = pd.read_csv(BASE_DIR + "/dataImporter/crypto_cumu.csv", index_col=0, parse_dates=True)
+    portfolio1 = rs.load_returns("tradi_cumu")
+    portfolio2 = rs.load_returns("crypto_cumu")
 
     # Since files are named "cumu", they likely already contain cumulative returns
     # So we DON'T need to calculate cumprod() again
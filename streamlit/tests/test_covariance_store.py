@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+from utils.covariance_store import CovarianceStore
+from utils.rolling_moments import rolling_moments
+
+
+def make_returns(num_dates=200, num_assets=3, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2020-01-01', periods=num_dates)
+    return pd.DataFrame(rng.normal(0, 0.01, (num_dates, num_assets)), index=dates,
+                        columns=[f"A{i}" for i in range(num_assets)])
+
+
+def test_eviction_keeps_the_cached_keys_of_the_request():
+    returns = make_returns()
+    store = CovarianceStore(capacity=4)
+    dates = returns.index[100:106]
+
+    # Fill the store, then request its oldest entry together with two new dates
+    store.get_moments(returns, dates[:4])
+    request = [dates[0], dates[4], dates[5]]
+    means, covs, counts = store.get_moments(returns, request)
+
+    expected = rolling_moments(returns, pd.DatetimeIndex(request))
+    np.testing.assert_allclose(means, expected[0])
+    np.testing.assert_allclose(covs, expected[1])
+    np.testing.assert_array_equal(counts, expected[2])
@@ -0,0 +1,47 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+from dataImporter.download_scheduler import DownloadScheduler
+from dataImporter.incremental_import import FixtureSource
+
+
+def make_prices(tickers=('A', 'B', 'C', 'D')):
+    dates = pd.bdate_range('2024-01-01', periods=20, name='Date')
+    return pd.DataFrame(np.arange(len(dates) * len(tickers), dtype=float).reshape(len(dates), -1) + 1,
+                        index=dates, columns=list(tickers))
+
+
+def make_scheduler(source, max_retries=3):
+    sleeps = []
+    scheduler = DownloadScheduler(source, batch_size=4, max_workers=1, max_retries=max_retries, backoff=1.,
+                                  sleep=sleeps.append)
+    return scheduler, sleeps
+
+
+def test_failed_request_is_retried_in_halves_with_backoff():
+    source = FixtureSource(make_prices(), failures={'B': 2})
+    scheduler, sleeps = make_scheduler(source)
+
+    prices = scheduler.fetch(['A', 'B', 'C', 'D'], '2024-01-01', '2024-02-01')
+
+    pd.testing.assert_frame_equal(prices, source.prices)
+    assert scheduler.failed == {'prices': []}
+    assert sorted(tickers for tickers, _, _ in source.requests) == \
+        [('A',), ('A', 'B'), ('A', 'B', 'C', 'D'), ('B',), ('C', 'D')]
+    # One wait per retry, doubling with the attempt
+    assert sorted(sleeps) == [1., 1., 2., 2.]
+
+
+def test_ticker_failing_every_retry_is_reported():
+    source = FixtureSource(make_prices(), failures={'C': 10})
+    scheduler, sleeps = make_scheduler(source, max_retries=2)
+
+    prices = scheduler.fetch(['A', 'B', 'C', 'D'], '2024-01-01', '2024-02-01')
+
+    assert list(prices.columns) == ['A', 'B', 'D']
+    assert scheduler.failed == {'prices': ['C']}
+    assert sorted(sleeps) == [1., 1., 2., 2.]
@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+import dataImporter.incremental_import as ii
+import utils.utilities as ut
+
+
+def make_prices(num_dates=120, tickers=('A', 'B', 'C'), seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2024-01-01', periods=num_dates, name='Date')
+    prices = pd.DataFrame(100 * np.exp(np.cumsum(rng.normal(0, 0.01, (num_dates, len(tickers))), axis=0)),
+                          index=dates, columns=list(tickers))
+    # A few missing prices inside the history, forward filled by the returns
+    prices.iloc[10:13, 1] = np.nan
+    return prices
+
+
+def update(source, tickers, end, data_dir):
+    updated = ii.update_all_prices([{'prices': 'prices', 'tickers': tickers}], source, '2024-01-01', end, data_dir)
+    return updated['prices']
+
+
+def test_refresh_only_fetches_the_gap_after_the_high_water_marks(tmp_path):
+    source = ii.FixtureSource(make_prices())
+    prices, first_new = update(source, ['A', 'B'], '2024-03-01', tmp_path)
+    assert first_new == pd.Timestamp('2024-01-01')
+    assert ii.load_manifest(tmp_path)['prices'] == {'A': '2024-02-29', 'B': '2024-02-29'}
+
+    # The second refresh asks for the days after the marks; the new ticker for its whole history
+    source.requests.clear()
+    prices, first_new = update(source, ['A', 'B', 'C'], '2024-04-01', tmp_path)
+    assert sorted(source.requests) == [
+        (('A', 'B'), pd.Timestamp('2024-03-01'), pd.Timestamp('2024-04-01')),
+        (('C',), pd.Timestamp('2024-01-01'), pd.Timestamp('2024-04-01')),
+    ]
+    assert first_new == pd.Timestamp('2024-01-01')
+    assert ii.load_manifest(tmp_path)['prices'] == {'A': '2024-03-29', 'B': '2024-03-29', 'C': '2024-03-29'}
+    pd.testing.assert_frame_equal(prices, source.prices.loc[:'2024-03-29'], check_freq=False)
+
+    # Up to date: nothing is requested
+    source.requests.clear()
+    assert update(source, ['A', 'B', 'C'], '2024-03-30', tmp_path)[1] is None
+    assert source.requests == []
+
+
+def test_appended_returns_equal_a_full_recompute(tmp_path):
+    source = ii.FixtureSource(make_prices())
+    for end in ['2024-02-01', '2024-03-01', '2024-06-29']:
+        prices, first_new = update(source, ['A', 'B'], end, tmp_path)
+        returns = ii.append_returns(prices, 'returns', first_new, tmp_path)
+        pd.testing.assert_frame_equal(returns, ut.dailyreturns(prices), check_freq=False)
+
+    # A new ticker back-fills the stored history, which is recomputed
+    prices, first_new = update(source, ['A', 'B', 'C'], '2024-06-29', tmp_path)
+    returns = ii.append_returns(prices, 'returns', first_new, tmp_path)
+    pd.testing.assert_frame_equal(returns, ut.dailyreturns(prices), check_freq=False)
+    pd.testing.assert_frame_equal(ii.load_stored('returns', tmp_path), returns, check_freq=False)
@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+
+# Rebalance calendars, as pandas date_range frequencies
+CALENDARS = {
+    'weekly': 'W-MON',
+    'monthly': 'MS',
+    'annual': 'YS',
+}
+
+
+class Backtester:
+    """
+    Vectorized backtest of a weight schedule with daily drift between rebalances.
+
+    returns: DataFrame of daily asset returns (dates x assets)
+    rebalance: 'daily', 'weekly', 'monthly', 'annual' or a list of custom rebalance dates
+    mask: optional boolean mask over the returns columns, only the assets it keeps can be held
+
+    At each rebalance date the portfolio is reset to the latest scheduled weights; in between
+    the weights drift with prices (buy and hold). Assets with a NaN weight are not held and the
+    remaining weights are renormalized over the held assets
+    """
+
+    def __init__(self, returns, rebalance='monthly', mask=None):
+        if mask is not None:
+            returns = returns.loc[:, np.asarray(mask, dtype=bool)]
+        self.returns = returns
+        self.rebalance = rebalance
+
+    def rebalance_dates(self, start):
+        """Period start dates from `start` to the end of the returns"""
+        end = self.returns.index[-1]
+        if isinstance(self.rebalance, str):
+            if self.rebalance == 'daily':
+                dates = self.returns.index[self.returns.index >= start]
+            else:
+                dates = pd.date_range(start=start, end=end, freq=CALENDARS[self.rebalance])
+        else:
+            dates = pd.DatetimeIndex(self.rebalance)
+            dates = dates[(dates >= start) & (dates <= end)]
+        return pd.DatetimeIndex([start]).union(dates)
+
+    def periods(self, schedule_dates, end=None):
+        """
+        Split the returns into rebalance periods.
+        Returns the period start dates, the schedule row in force for each period, the dates, period
+        index and return values of the days in the backtest, and each period's first / last day positions
+        """
+        boundaries = self.rebalance_dates(schedule_dates[0])
+        if end is not None:
+            boundaries = boundaries[boundaries < pd.Timestamp(end)]
+
+        target_rows = np.searchsorted(schedule_dates.values, boundaries.values, side='right') - 1
+
+        # Assign every day to the period that contains it, days outside the backtest are dropped
+        dates = self.returns.index
+        period_idx = np.searchsorted(boundaries.values, dates.values, side='right') - 1
+        in_backtest = period_idx >= 0
+        if end is not None:
+            in_backtest &= dates < pd.Timestamp(end)
+        dates = dates[in_backtest]
+        period_idx = period_idx[in_backtest]
+        values = self.returns.values[in_backtest]
+
+        # Positions of each period's days (dates are sorted, so periods are contiguous)
+        starts = np.searchsorted(period_idx, np.arange(len(boundaries)), side='left')
+        ends = np.searchsorted(period_idx, np.arange(len(boundaries)), side='right')
+
+        return boundaries, target_rows, dates, period_idx, values, starts, ends
+
+    def run(self, weight_schedule, end=None):
+        """
+        weight_schedule: DataFrame of target weights indexed by the date they become effective,
+        columns matching the returns columns (missing columns are treated as not held)
+        end: optional end date (exclusive) of the backtest, the end of the returns otherwise
+
+        Returns a dict with
+          'returns':  daily portfolio returns (Series)
+          'weights':  drifted start-of-day weights (DataFrame, days x assets)
+          'turnover': sum of absolute trades at each rebalance (Series)
+          'periods':  rebalance date each day belongs to (Series)
+        """
+        weight_schedule = weight_schedule.sort_index()
+        targets = weight_schedule.reindex(columns=self.returns.columns)
+        boundaries, target_rows, dates, period_idx, values, starts, ends = self.periods(weight_schedule.index, end)
+
+        num_assets = values.shape[1]
+        portfolio_returns = np.full(len(dates), np.nan)
+        drifted_weights = np.zeros((len(dates), num_assets))
+        turnover = np.zeros(len(boundaries))
+        held_weights = np.zeros(num_assets)
+
+        for k in range(len(boundaries)):
+            target = targets.values[target_rows[k]]
+            held = ~np.isnan(target)
+            weights = np.where(held, target, 0.)
+            weights = weights / np.sum(weights)
+
+            turnover[k] = np.sum(np.abs(weights - held_weights))
+
+            period_returns = values[starts[k]:ends[k]][:, held]
+            if len(period_returns) == 0:
+                held_weights = weights
+                continue
+
+            # Buy and hold: value is the weighted sum of each asset's cumulative growth
+            growth = np.cumprod(1 + period_returns, axis=0)
+            value = np.dot(growth, weights[held])
+            previous_growth = np.vstack([np.ones(held.sum()), growth[:-1]])
+            previous_value = np.concatenate(([1.], value[:-1]))
+
+            portfolio_returns[starts[k]:ends[k]] = value / previous_value - 1
+            drifted_weights[starts[k]:ends[k], held] = weights[held] * previous_growth / previous_value[:, None]
+
+            held_weights = np.zeros(num_assets)
+            held_weights[held] = weights[held] * growth[-1] / value[-1]
+
+        return {
+            'returns': pd.Series(portfolio_returns, index=dates, name='Daily Returns'),
+            'weights': pd.DataFrame(drifted_weights, index=dates, columns=self.returns.columns),
+            'turnover': pd.Series(turnover, index=boundaries, name='Turnover'),
+            'periods': pd.Series(boundaries[period_idx], index=dates, name='Period'),
+        }
+
+    def run_scenarios(self, schedule_dates, scenario_weights, end=None):
+        """
+        Backtest several weight schedules on the same calendar in one pass.
+        schedule_dates: dates the scheduled weights become effective
+        scenario_weights: array (scenarios x schedule dates x assets) of fully invested weights
+        Within a period the cumulative growth of the assets is shared by all the scenarios,
+        so each period costs one (days x assets) @ (assets x scenarios) product.
+        Returns the daily portfolio returns (days x scenarios array) and the dates
+        """
+        schedule_dates = pd.DatetimeIndex(schedule_dates)
+        scenario_weights = np.asarray(scenario_weights, dtype=float)
+        boundaries, target_rows, dates, period_idx, values, starts, ends = self.periods(schedule_dates, end)
+
+        portfolio_returns = np.full((len(dates), scenario_weights.shape[0]), np.nan)
+
+        for k in range(len(boundaries)):
+            period_returns = values[starts[k]:ends[k]]
+            if len(period_returns) == 0:
+                continue
+            weights = scenario_weights[:, target_rows[k], :]
+            weights = weights / np.sum(weights, axis=1, keepdims=True)
+
+            growth = np.cumprod(1 + period_returns, axis=0)
+            value = np.dot(growth, weights.T)
+            previous_value = np.vstack([np.ones(len(weights)), value[:-1]])
+            portfolio_returns[starts[k]:ends[k]] = value / previous_value - 1
+
+        return portfolio_returns, dates
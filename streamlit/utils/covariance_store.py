@@ -0,0 +1,96 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils.rolling_moments import rolling_moments
+
+
+def dataset_fingerprint(returns):
+    """Content hash of a returns DataFrame (dates, column names and values)"""
+    digest = hashlib.sha1()
+    digest.update(np.asarray(returns.index.values, dtype='datetime64[ns]').tobytes())
+    digest.update('|'.join(map(str, returns.columns)).encode())
+    digest.update(np.ascontiguousarray(returns.values, dtype=float).tobytes())
+    return digest.hexdigest()
+
+
+class CovarianceStore:
+    """
+    Annualized lookback means and covariances keyed by (dataset fingerprint, window end, lookback).
+    Matrices with the same number of assets live in one contiguous (capacity x n x n) array;
+    when it is full the least recently used entry is evicted.
+    The optimizer and the risk attribution read from the same store, so both see exactly
+    the same matrices and each one is computed once
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.slabs = {}
+        self.lock = threading.Lock()
+
+    def slab(self, num_assets):
+        if num_assets not in self.slabs:
+            self.slabs[num_assets] = {
+                'slots': OrderedDict(),
+                'free': list(range(self.capacity - 1, -1, -1)),
+                'means': np.empty((self.capacity, num_assets)),
+                'covs': np.empty((self.capacity, num_assets, num_assets)),
+                'counts': np.empty(self.capacity, dtype=int),
+            }
+        return self.slabs[num_assets]
+
+    def get_moments(self, returns, dates, lookback=63):
+        """
+        Same output as rolling_moments(returns, dates, lookback): means, covariances and window sizes.
+        Only the dates missing from the store are computed
+        """
+        dates = pd.DatetimeIndex(dates)
+        fingerprint = dataset_fingerprint(returns)
+        keys = [(fingerprint, date, lookback) for date in dates]
+
+        # More dates than the store can hold: compute without caching
+        if len(set(keys)) > self.capacity:
+            return rolling_moments(returns, dates, lookback=lookback)
+
+        with self.lock:
+            slab = self.slab(returns.shape[1])
+            slots = slab['slots']
+
+            # Pin the cached keys of this request so the evictions below cannot drop them
+            for key in keys:
+                if key in slots:
+                    slots.move_to_end(key)
+
+            missing = [k for k, key in enumerate(keys) if key not in slots]
+            if missing:
+                means, covs, counts = rolling_moments(returns, dates[missing], lookback=lookback)
+                for j, k in enumerate(missing):
+                    if keys[k] in slots:
+                        continue
+                    if not slab['free']:
+                        _, evicted = slots.popitem(last=False)
+                        slab['free'].append(evicted)
+                    slot = slab['free'].pop()
+                    slab['means'][slot] = means[j]
+                    slab['covs'][slot] = covs[j]
+                    slab['counts'][slot] = counts[j]
+                    slots[keys[k]] = slot
+
+            rows = []
+            for key in keys:
+                slots.move_to_end(key)
+                rows.append(slots[key])
+
+            # Fancy indexing returns copies, callers cannot corrupt the store
+            return slab['means'][rows], slab['covs'][rows], slab['counts'][rows]
+
+    def clear(self):
+        with self.lock:
+            self.slabs = {}
+
+
+# Store shared by every caller in the process
+default_store = CovarianceStore()
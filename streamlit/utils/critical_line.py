@@ -0,0 +1,106 @@
+import numpy as np
+from utils.qp_solver import solve_simplex_qp
+
+
+# Critical line algorithm for the long-only, fully invested mean-variance problem
+#
+#   max_w  mu' w - 0.5 * gamma * w' S w      s.t.  sum(w) = 1,  w >= 0
+#
+# With the risk tolerance t = 1 / gamma the optimal weights are piecewise linear
+# in t: between two turning points the set of invested assets is fixed and
+# w(t) = a + t * b. The path starts at the minimum variance portfolio (t = 0) and
+# ends at the highest expected return portfolio (t -> infinity), so one pass gives
+# the optimum for every risk aversion.
+
+def free_segment(means, cov_matrix, free):
+    """
+    Solve the KKT system on the free assets for the two right-hand sides, so that
+    w(t) = a + t * b and the budget multiplier is nu(t) = nu_a + t * nu_b
+    """
+    num_free = int(np.sum(free))
+    lhs = np.zeros((num_free + 1, num_free + 1))
+    lhs[:num_free, :num_free] = cov_matrix[np.ix_(free, free)]
+    lhs[:num_free, num_free] = 1.
+    lhs[num_free, :num_free] = 1.
+
+    rhs = np.zeros((num_free + 1, 2))
+    rhs[num_free, 0] = 1.
+    rhs[:num_free, 1] = means[free]
+    solution = np.linalg.solve(lhs, rhs)
+
+    a = np.zeros(len(means))
+    b = np.zeros(len(means))
+    a[free] = solution[:num_free, 0]
+    b[free] = solution[:num_free, 1]
+    return a, b, solution[num_free, 0], solution[num_free, 1]
+
+
+def critical_line(means, cov_matrix, tol=1e-12, max_turns=100):
+    """
+    Turning points of the optimal weights as a function of the risk tolerance t = 1 / risk aversion.
+    Returns the increasing turning tolerances (starting at 0) and the weights at each of them
+    """
+    means = np.asarray(means, dtype=float)
+    cov_matrix = np.asarray(cov_matrix, dtype=float)
+
+    # Minimum variance portfolio (t = 0)
+    weights = solve_simplex_qp(np.zeros(len(means)), cov_matrix, 1.)
+    free = weights > tol
+
+    t = 0.
+    turning_t = [t]
+    turning_weights = [weights]
+
+    for _ in range(max_turns):
+        a, b, nu_a, nu_b = free_segment(means, cov_matrix, free)
+
+        # Event 1: an invested asset's weight falls to zero
+        t_out = np.full(len(means), np.inf)
+        leaving = free & (b < -tol)
+        t_out[leaving] = -a[leaving] / b[leaving]
+
+        # Event 2: the multiplier of an excluded asset (S w)_j + nu - t * mu_j falls to zero
+        c = np.dot(cov_matrix, a) + nu_a
+        d = np.dot(cov_matrix, b) + nu_b - means
+        t_in = np.full(len(means), np.inf)
+        entering = ~free & (d < -tol)
+        t_in[entering] = -c[entering] / d[entering]
+
+        t_out[t_out <= t + tol] = np.inf
+        t_in[t_in <= t + tol] = np.inf
+        t_next = min(np.min(t_out), np.min(t_in))
+        if not np.isfinite(t_next):
+            break
+
+        if np.min(t_out) <= np.min(t_in):
+            free[np.argmin(t_out)] = False
+        else:
+            free[np.argmin(t_in)] = True
+
+        t = t_next
+        weights = np.clip(a + t * b, 0., None)
+        turning_t.append(t)
+        turning_weights.append(weights / np.sum(weights))
+
+    return np.array(turning_t), np.array(turning_weights)
+
+
+def frontier_weights(turning_t, turning_weights, risk_aversion):
+    """Optimal weights for a risk aversion, interpolated between the turning points"""
+    if risk_aversion == 0:
+        return turning_weights[-1].copy()
+    t = 1. / risk_aversion
+    return np.array([np.interp(t, turning_t, turning_weights[:, i]) for i in range(turning_weights.shape[1])])
+
+
+def frontier_curve(means, cov_matrix, turning_t, turning_weights, num_points=50):
+    """
+    Expected return and volatility along the efficient frontier, sampled between the
+    minimum variance and the highest return portfolios
+    """
+    t_max = turning_t[-1] if turning_t[-1] > 0 else 1.
+    weights = np.array([frontier_weights(turning_t, turning_weights, 1. / t) if t > 0 else turning_weights[0]
+                        for t in np.linspace(0., t_max, num_points)])
+    returns = np.dot(weights, means)
+    volatility = np.sqrt(np.einsum('ki,ij,kj->k', weights, cov_matrix, weights))
+    return returns, volatility, weights
@@ -0,0 +1,95 @@
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+sys.path.append(str(Path(__file__).parent.parent))
+import dataImporter.return_cube as rc
+import utils.incremental_backtest as ib
+import utils.utilities as ut
+from utils.covariance_store import dataset_fingerprint
+
+
+# Caches shared by every session of the app.
+# Return panels are resources: one read-only copy per process, reloaded when the data files change.
+# ERC backtests and metrics are data: the persisted backtest of the import pipeline is served when it
+# is current, otherwise it is recomputed once, keyed by the panel fingerprint and the parameters.
+
+DATA_DIR = rc.DATA_DIR
+
+PANEL_TTL = 24 * 3600
+RESULT_TTL = 6 * 3600
+
+
+def data_version(universe):
+    """Modification times of the files a universe is read from"""
+    asset_class, _ = rc.UNIVERSES[universe]
+    files = [rc.INDEX_FILE, f"{asset_class}_returns.parquet", f"{asset_class}_returns.csv"]
+    paths = [os.path.join(DATA_DIR, f) for f in files]
+    return tuple(os.path.getmtime(p) if os.path.exists(p) else None for p in paths)
+
+
+@st.cache_resource(ttl=PANEL_TTL, max_entries=16, show_spinner=False)
+def load_panel(universe, version):
+    """Returns of a universe and their fingerprint (shared object, must not be modified)"""
+    returns = rc.load_universe(universe)
+    return returns, dataset_fingerprint(returns)
+
+
+def panel(universe):
+    return load_panel(universe, data_version(universe))
+
+
+@st.cache_data(ttl=RESULT_TTL, max_entries=64, show_spinner=False)
+def erc_results(universe, fingerprint, weights_file, weights_mtime, startyear):
+    returns, _ = panel(universe)
+    erc_returns = ut.erc_portfolio(returns, weights_file=weights_file)
+    return ut.erc_performance(erc_returns, returns, startyear)
+
+
+@st.cache_data(ttl=RESULT_TTL, max_entries=64, show_spinner=False)
+def stored_erc_results(state_file, state_mtime, weights_file, weights_mtime, last_date, startyear):
+    return ib.stored_erc_performance(state_file, weights_file, last_date, startyear)
+
+
+def erc_universe(universe, startyear=2017):
+    """ERC backtest of a universe: flat daily returns, mean, volatility, Sharpe ratio, cumulative return"""
+    returns, fingerprint = panel(universe)
+    weights_file = os.path.join(DATA_DIR, f"erc_weights_{universe}.csv")
+    weights_mtime = os.path.getmtime(weights_file)
+
+    # 1. Backtest persisted by the import pipeline, if it covers the current returns
+    state_file = os.path.join(DATA_DIR, f"erc_backtest_state_{universe}.pkl")
+    if os.path.exists(state_file):
+        stored = stored_erc_results(state_file, os.path.getmtime(state_file), weights_file, weights_mtime,
+                                    returns.index[-1], startyear)
+        if stored is not None:
+            return stored
+
+    # 2. Full backtest over the history
+    return erc_results(universe, fingerprint, weights_file, weights_mtime, startyear)
+
+
+@st.cache_data(ttl=RESULT_TTL, max_entries=8, show_spinner=False)
+def bonds_results(fingerprint, startyear):
+    returns, _ = panel('bonds')
+    return ut.bonds_performance(returns, startyear)
+
+
+def bonds_performance(startyear=2017):
+    """Bonds index: flat daily returns, mean, volatility, Sharpe ratio, cumulative return"""
+    _, fingerprint = panel('bonds')
+    return bonds_results(fingerprint, startyear)
+
+
+@st.cache_data(ttl=RESULT_TTL, max_entries=16, show_spinner=False)
+def read_risk_contributions(risk_contrib_file, mtime):
+    return pd.read_csv(risk_contrib_file)
+
+
+def risk_contributions(universe):
+    """Yearly ERC risk contributions of a universe"""
+    risk_contrib_file = os.path.join(DATA_DIR, f"erc_risk_contributions_{universe}.csv")
+    return read_risk_contributions(risk_contrib_file, os.path.getmtime(risk_contrib_file))
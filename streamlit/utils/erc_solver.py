@@ -0,0 +1,155 @@
+import numpy as np
+import pandas as pd
+
+
+# ERC solver (Spinu log-barrier formulation)
+#
+#   min_y  0.5 * y' S y - sum_i b_i * log(y_i)      with y > 0
+#
+# The problem is strictly convex, its minimizer satisfies y_i * (S y)_i = b_i,
+# so the normalized w = y / sum(y) is the portfolio whose risk contributions
+# are proportional to the budgets b.
+
+def erc_residual(weights, cov_matrix, budgets=None):
+    """Maximum deviation between the relative risk contributions and the budgets"""
+    weights = np.asarray(weights, dtype=float)
+    cov_matrix = np.asarray(cov_matrix, dtype=float)
+    num_assets = len(weights)
+    if budgets is None:
+        budgets = np.full(num_assets, 1. / num_assets)
+    budgets = np.asarray(budgets, dtype=float) / np.sum(budgets)
+
+    risk_contribs = weights * np.dot(cov_matrix, weights)
+    return np.max(np.abs(risk_contribs / np.sum(risk_contribs) - budgets))
+
+
+def inverse_volatility_weights(cov_matrix):
+    """Weights proportional to the inverse of each asset's volatility"""
+    inv_vol = 1. / np.sqrt(np.diag(np.asarray(cov_matrix, dtype=float)))
+    return inv_vol / np.sum(inv_vol)
+
+
+def starting_point(sigma, budgets, initial_weights=None):
+    """
+    Starting point of the solvers, scaled so that y' S y = sum(b) as at the optimum.
+    Missing (NaN or non-positive) initial weights, e.g. assets that were not in the
+    previous year's universe, are filled with budget-scaled inverse volatility weights
+    """
+    y = budgets * inverse_volatility_weights(sigma) * len(budgets)
+    if initial_weights is not None:
+        initial_weights = np.asarray(initial_weights, dtype=float)
+        known = np.isfinite(initial_weights) & (initial_weights > 0)
+        if np.any(known):
+            # Put the new assets on the same scale as the known ones
+            y[known] = initial_weights[known] * np.sum(y[known]) / np.sum(initial_weights[known])
+    return y * np.sqrt(np.sum(budgets) / np.dot(y, np.dot(sigma, y)))
+
+
+def erc_newton(cov_matrix, budgets=None, initial_weights=None, tol=1e-18, max_iter=100):
+    """
+    Compute ERC weights with Newton steps on the convex log-barrier problem.
+    Returns the weights and the convergence residual (see erc_residual)
+    """
+    cov_matrix = np.asarray(cov_matrix, dtype=float)
+    num_assets = len(cov_matrix)
+    if budgets is None:
+        budgets = np.full(num_assets, 1. / num_assets)
+    budgets = np.asarray(budgets, dtype=float) / np.sum(budgets)
+
+    # Rescale the covariance so the problem is well conditioned whatever the return frequency
+    scale = np.mean(np.diag(cov_matrix))
+    sigma = cov_matrix / scale
+
+    y = starting_point(sigma, budgets, initial_weights)
+
+    def objective(y):
+        return 0.5 * np.dot(y, np.dot(sigma, y)) - np.dot(budgets, np.log(y))
+
+    for _ in range(max_iter):
+        sigma_y = np.dot(sigma, y)
+        gradient = sigma_y - budgets / y
+        hessian = sigma + np.diag(budgets / y**2)
+        step = np.linalg.solve(hessian, gradient)
+
+        # Newton decrement, stop once the quadratic model predicts no further progress
+        decrement = np.dot(gradient, step)
+        if 0.5 * decrement <= tol:
+            break
+
+        # Backtracking line search keeping y strictly positive
+        t = 1.
+        negative = step > 0
+        if np.any(negative):
+            t = min(1., 0.99 * np.min(y[negative] / step[negative]))
+        f_y = objective(y)
+        while objective(y - t * step) > f_y - 0.25 * t * decrement and t > 1e-12:
+            t *= 0.5
+        y = y - t * step
+
+    weights = y / np.sum(y)
+    return weights, erc_residual(weights, cov_matrix, budgets)
+
+
+def erc_coordinate_descent(cov_matrix, budgets=None, initial_weights=None, tol=1e-12, max_sweeps=1000):
+    """
+    Compute ERC weights by cyclical coordinate descent on the log-barrier problem.
+    Each coordinate is updated in closed form, keeping S y up to date, so a sweep costs O(n^2).
+    initial_weights (e.g. the previous year's ERC weights) warm start the solver.
+    Returns the weights and the convergence residual (see erc_residual)
+    """
+    cov_matrix = np.asarray(cov_matrix, dtype=float)
+    num_assets = len(cov_matrix)
+    if budgets is None:
+        budgets = np.full(num_assets, 1. / num_assets)
+    budgets = np.asarray(budgets, dtype=float) / np.sum(budgets)
+
+    scale = np.mean(np.diag(cov_matrix))
+    sigma = cov_matrix / scale
+    diag = np.diag(sigma).copy()
+
+    y = starting_point(sigma, budgets, initial_weights)
+    sigma_y = np.dot(sigma, y)
+
+    for _ in range(max_sweeps):
+        for i in range(num_assets):
+            # Root of  s_ii y_i^2 + c_i y_i - b_i = 0  with c_i = sum_{j != i} s_ij y_j
+            c_i = sigma_y[i] - diag[i] * y[i]
+            y_i = (-c_i + np.sqrt(c_i * c_i + 4. * diag[i] * budgets[i])) / (2. * diag[i])
+            sigma_y += sigma[:, i] * (y_i - y[i])
+            y[i] = y_i
+
+        risk_contribs = y * sigma_y
+        if np.max(np.abs(risk_contribs / np.sum(risk_contribs) - budgets)) <= tol:
+            break
+
+    weights = y / np.sum(y)
+    return weights, erc_residual(weights, cov_matrix, budgets)
+
+
+ERC_SOLVERS = {'newton': erc_newton, 'ccd': erc_coordinate_descent}
+
+
+def erc_year(daily_returns_year, method='newton', initial_weights=None, mask=None):
+    """
+    ERC weights and risk contributions for one year of daily returns.
+    Assets with missing returns in the year are dropped.
+    initial_weights: optional Series of weights indexed by asset name (e.g. last year's)
+    mask: optional boolean mask over the columns, only the assets it keeps are used (e.g. an ESG screen)
+    Returns the weights and risk contributions as Series, and the convergence residual
+    """
+    if mask is not None:
+        daily_returns_year = daily_returns_year.loc[:, np.asarray(mask, dtype=bool)]
+    daily_returns_year = daily_returns_year.dropna(axis=1)
+    columns = daily_returns_year.columns
+    cov_matrix = daily_returns_year.cov().values
+
+    if initial_weights is not None:
+        initial_weights = initial_weights.reindex(columns).values
+
+    weights, residual = ERC_SOLVERS[method](cov_matrix, initial_weights=initial_weights)
+
+    # Risk contribution of each asset: w_i * (S w)_i / portfolio volatility
+    marginal_contribution = np.dot(cov_matrix, weights) / np.sqrt(np.dot(weights, np.dot(cov_matrix, weights)))
+    risk_contribs = weights * marginal_contribution
+
+    return pd.Series(weights, index=columns), pd.Series(risk_contribs, index=columns), residual
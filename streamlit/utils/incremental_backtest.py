@@ -0,0 +1,236 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.backtester import Backtester
+from utils.covariance_store import dataset_fingerprint
+from utils.erc_solver import erc_year
+
+
+class IncrementalBacktest:
+    """
+    Backtest state that can be extended with new trading days instead of rerunning the history.
+
+    The state holds the end-of-day drifted weights, the current rebalance period, the daily portfolio
+    returns, the cumulative wealth and its running maximum, and running accumulators (count, mean,
+    sum of squared deviations) for the erc_performance metrics. Extending costs O(new days); the weight provider is only called
+    when a new rebalance date is crossed.
+
+    weight_provider(rebalance_date) must return the target weights (Series indexed by asset)
+    using only data before rebalance_date
+    rebalance: 'weekly', 'monthly' or 'annual' (see Backtester)
+    start: first date counted in the metrics (e.g. startyear of erc_performance)
+    """
+
+    def __init__(self, weight_provider, rebalance='annual', start=None):
+        self.weight_provider = weight_provider
+        self.rebalance = rebalance
+        self.start = None if start is None else pd.Timestamp(start)
+
+        self.last_date = None
+        self.period_start = None
+        self.held_weights = None
+
+        self.returns = pd.Series(dtype=float, name='Daily Returns')
+        self.wealth = 1.
+        self.running_max = 1.
+        self.max_drawdown = 0.
+        self.count = 0
+        self.mean = 0.
+        self.m2 = 0.
+
+    def extend(self, returns, first_rebalance=None):
+        """
+        Add the trading days of `returns` after the last processed date.
+        first_rebalance: date of the first rebalance when the state is empty
+        Returns the daily portfolio returns of the new days (Series)
+        """
+        if self.last_date is not None:
+            returns = returns.loc[returns.index > self.last_date]
+        if len(returns) == 0:
+            return pd.Series(dtype=float, name='Daily Returns')
+
+        if self.period_start is None:
+            self.period_start = pd.Timestamp(first_rebalance if first_rebalance is not None else returns.index[0])
+            self.held_weights = self.weight_provider(self.period_start)
+            returns = returns.loc[returns.index >= self.period_start]
+
+        # Rebalance dates crossed by the new days
+        boundaries = Backtester(returns, rebalance=self.rebalance).rebalance_dates(self.period_start)
+        boundaries = boundaries[boundaries > self.period_start]
+
+        new_returns = []
+        for chunk_start, chunk_end in zip([None] + list(boundaries), list(boundaries) + [None]):
+            chunk = returns
+            if chunk_start is not None:
+                chunk = chunk.loc[chunk.index >= chunk_start]
+            if chunk_end is not None:
+                chunk = chunk.loc[chunk.index < chunk_end]
+
+            if chunk_start is not None:
+                # New period: re-solve and reset to the target weights
+                self.period_start = chunk_start
+                self.held_weights = self.weight_provider(chunk_start)
+            if len(chunk) == 0:
+                continue
+
+            new_returns.append(self.drift(chunk))
+
+        portfolio_returns = pd.concat(new_returns) if new_returns else pd.Series(dtype=float)
+        portfolio_returns.name = 'Daily Returns'
+        self.last_date = returns.index[-1]
+        self.returns = portfolio_returns if len(self.returns) == 0 else pd.concat([self.returns, portfolio_returns])
+        self.accumulate(portfolio_returns)
+        return portfolio_returns
+
+    def drift(self, chunk):
+        """Buy and hold the current weights over days of a single period"""
+        weights = self.held_weights.dropna()
+        weights = weights[weights.index.intersection(chunk.columns)]
+        weights = weights / np.sum(weights)
+
+        growth = np.cumprod(1 + chunk[weights.index].values, axis=0)
+        value = np.dot(growth, weights.values)
+        previous_value = np.concatenate(([1.], value[:-1]))
+
+        self.held_weights = pd.Series(weights.values * growth[-1] / value[-1], index=weights.index)
+        return pd.Series(value / previous_value - 1, index=chunk.index)
+
+    def accumulate(self, portfolio_returns):
+        """
+        Merge the new returns into the wealth, drawdown and moment accumulators.
+        Missing returns are skipped as in erc_performance (pandas skipna): flat days for the wealth,
+        left out of the moments
+        """
+        if self.start is not None:
+            portfolio_returns = portfolio_returns[portfolio_returns.index >= self.start]
+        values = portfolio_returns.values
+        if len(values) == 0:
+            return
+
+        wealth = self.wealth * np.cumprod(1 + np.nan_to_num(values))
+        running_max = np.maximum.accumulate(np.concatenate(([self.running_max], wealth)))[1:]
+        self.max_drawdown = min(self.max_drawdown, np.min((wealth - running_max) / running_max))
+        self.wealth = wealth[-1]
+        self.running_max = running_max[-1]
+
+        # Chan et al. update of the mean and sum of squared deviations
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        count = len(values)
+        mean = np.mean(values)
+        m2 = np.sum((values - mean) ** 2)
+        delta = mean - self.mean
+        total = self.count + count
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def metrics(self):
+        """Annualized return, volatility, Sharpe ratio and cumulative return, as erc_performance"""
+        trading_days_per_year = 252
+        risk_free_rate = 0.015
+
+        annualized_average_return = self.mean * trading_days_per_year
+        annualized_volatility = np.sqrt(self.m2 / (self.count - 1)) * np.sqrt(trading_days_per_year)
+        sharpe_ratio = (annualized_average_return - risk_free_rate) / annualized_volatility
+        cumulative_return = self.wealth - 1
+
+        return annualized_average_return, annualized_volatility, sharpe_ratio, cumulative_return
+
+    def performance(self):
+        """Daily returns from start and metrics, as erc_performance returns them"""
+        returns = self.returns if self.start is None else self.returns[self.returns.index >= self.start]
+        return (returns.to_frame('Daily Returns'), *self.metrics())
+
+    def save(self, state_file):
+        """Persist the state (the weight provider is not saved)"""
+        state = {key: value for key, value in self.__dict__.items() if key != 'weight_provider'}
+        pd.to_pickle(state, state_file)
+
+    @classmethod
+    def load(cls, state_file, weight_provider):
+        backtest = cls(weight_provider)
+        backtest.__dict__.update(pd.read_pickle(state_file))
+        return backtest
+
+
+def erc_weight_provider(returns, method='newton', mask=None, weights_file=None):
+    """
+    ERC weights solved on the calendar year before each (1 January) rebalance.
+    weights_file: optional yearly weights CSV (erc_weights_<name>.csv, one row per solved year);
+    its weights are used as is, only the years it does not cover are solved
+    """
+    weight_schedule = None
+    if weights_file is not None:
+        weight_schedule = pd.read_csv(weights_file).set_index('year')
+        weight_schedule.index = weight_schedule.index.astype(int)
+
+    def provider(rebalance_date):
+        year = rebalance_date.year - 1
+        if weight_schedule is not None and year in weight_schedule.index:
+            return weight_schedule.loc[year].dropna()
+        daily_returns_year = returns.loc[returns.index.year == year]
+        weights, _, _ = erc_year(daily_returns_year, method=method, mask=mask)
+        return weights
+
+    return provider
+
+
+def file_version(path):
+    """sha1 of a file's content, None without a file"""
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def extend_erc_backtest(returns, state_file, startyear=2017, method='newton', mask=None, weights_file=None):
+    """
+    Extend (or start) the persisted annual ERC backtest of a universe with the new days of `returns`.
+    mask: optional boolean mask over the returns columns (e.g. an ESG screen)
+    weights_file: yearly ERC weights to hold (see erc_weight_provider); when its content changed since
+    the state was saved, the backtest restarts from the first rebalance. It also restarts when the
+    returns up to the last processed day changed (e.g. recomputed after a back-fill)
+    Returns the new daily portfolio returns and the metrics over the whole history
+    """
+    provider = erc_weight_provider(returns, method, mask, weights_file)
+    weights_version = file_version(weights_file)
+
+    backtest = None
+    if os.path.exists(state_file):
+        backtest = IncrementalBacktest.load(state_file, provider)
+        history = returns.loc[returns.index <= backtest.last_date] if backtest.last_date is not None else returns.iloc[:0]
+        if (getattr(backtest, 'weights_version', None) != weights_version
+                or getattr(backtest, 'history_version', None) != dataset_fingerprint(history)):
+            backtest = None
+
+    if backtest is not None:
+        new_returns = backtest.extend(returns)
+    else:
+        backtest = IncrementalBacktest(provider, rebalance='annual', start=f"{startyear}-01-01")
+        backtest.weights_version = weights_version
+        new_returns = backtest.extend(returns, first_rebalance=f"{returns.index[0].year + 1}-01-01")
+
+    backtest.history_version = dataset_fingerprint(returns.loc[returns.index <= backtest.last_date])
+    backtest.save(state_file)
+    return new_returns, backtest.metrics()
+
+
+def stored_erc_performance(state_file, weights_file=None, last_date=None, startyear=2017):
+    """
+    Daily returns and metrics of a persisted ERC backtest (see extend_erc_backtest), as erc_performance
+    returns them. None when the state is missing or not current: other start year, weights file
+    changed since it was saved, or not extended up to last_date
+    """
+    if not os.path.exists(state_file):
+        return None
+    backtest = IncrementalBacktest.load(state_file, None)
+    if ('returns' not in backtest.__dict__ or backtest.start != pd.Timestamp(f"{startyear}-01-01")
+            or getattr(backtest, 'weights_version', None) != file_version(weights_file)
+            or (last_date is not None and backtest.last_date != pd.Timestamp(last_date))):
+        return None
+    return backtest.performance()
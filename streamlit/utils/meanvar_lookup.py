@@ -0,0 +1,186 @@
+import os
+import sys
+from functools import lru_cache
+from itertools import product
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+import utils.utilities as ut
+import dataImporter.return_cube as rc
+
+
+# Precomputed mean-variance results for every (asset selection, risk score) the
+# ERC portfolio page can ask for. The artifact is a single .npz file indexed by
+# selection and risk score, so "Launch" becomes a lookup instead of a backtest.
+
+RISK_SCORES = list(range(11))
+ASSET_NAMES = ['Equity', 'EquityESG', 'Commodity', 'CommodityESG', 'Crypto', 'Bonds']
+METRICS = ['mean', 'vol', 'sharpe', 'cumu']
+
+
+def valid_selections():
+    """
+    Every distinct non-empty 6-element selection the page can build from its toggles
+    [ Equity(Std), Equity(ESG), Commodity(Std), Commodity(ESG), Crypto, Bonds]
+    """
+    selections = []
+    for bonds, equity, commodity, crypto, is_esg in product([0, 1], repeat=5):
+        selection = [0, 0, 0, 0, 0, 0]
+        selection[5] = bonds
+        selection[4] = crypto
+        if equity:
+            selection[1 if is_esg else 0] = 1
+        if commodity:
+            selection[3 if is_esg else 2] = 1
+        if sum(selection) > 0 and selection not in selections:
+            selections.append(selection)
+    return selections
+
+
+def load_erc_flats(data_dir):
+    """
+    Daily returns of the five ERC portfolios and the bonds index, as on the portfolio page
+    (None for a universe whose returns or ERC weights are not in data_dir)
+    """
+    flats = []
+    for name in ['equity', 'equity_esg', 'commodity', 'commodity_esg', 'crypto']:
+        weights_file = data_dir + f"/erc_weights_{name}.csv"
+        try:
+            returns = rc.load_universe(name, data_dir=data_dir)
+        except FileNotFoundError:
+            returns = None
+        if returns is None or not os.path.exists(weights_file):
+            print(f"No data for {name}, its selections are not precomputed")
+            flats.append(None)
+            continue
+        erc_returns = ut.erc_portfolio(returns, weights_file=weights_file)
+        flats.append(ut.erc_performance(erc_returns, returns, 2017)[0])
+
+    bonds_returns = rc.load_universe("bonds", data_dir=data_dir)
+    flats.append(ut.bonds_performance(bonds_returns, 2017)[0])
+    return flats
+
+
+def build_meanvar_lookup(data_dir, output_file=None):
+    """
+    Run meanvar_portfolio (read off the frontiers of meanvar_frontier), erc_performance and
+    calculate_risk_contribution for every valid (selection, risk score) pair and save the results
+    to a compressed .npz file. Selections of universes without data are left out (the page
+    computes them live)
+    """
+    if output_file is None:
+        output_file = data_dir + "/meanvar_lookup.npz"
+
+    flats = load_erc_flats(data_dir)
+    selections = [selection for selection in valid_selections()
+                  if all(flat is not None for flat, include in zip(flats, selection) if include)]
+
+    results = {}
+    for s, selection in enumerate(selections):
+        combined_returns = ut.combine_returns(*flats, selection)
+        # One efficient frontier per month serves every risk score of the selection
+        print(f"Precomputing selection {selection}...")
+        frontier = ut.meanvar_frontier(combined_returns)
+        for risk_score in RISK_SCORES:
+            risk_aversion = ut.riskscore_to_aversion(risk_score)
+            all_portfolio_returns, weights_df = ut.meanvar_portfolio(combined_returns, risk_aversion, frontier=frontier)
+            flat, mean, vol, sharpe, cumu = ut.erc_performance(all_portfolio_returns, combined_returns, 2018)
+            risk_contrib_df = ut.calculate_risk_contribution(weights_df, combined_returns)
+            results[(s, risk_score)] = (flat, weights_df, risk_contrib_df, [mean, vol, sharpe, cumu])
+
+    # Shared axes
+    dates = sorted(set().union(*[r[0].index for r in results.values()]))
+    dates = pd.DatetimeIndex(dates)
+    weight_dates = results[(0, 0)][1].index
+
+    shape = (len(selections), len(RISK_SCORES))
+    returns = np.full(shape + (len(dates),), np.nan)
+    weights = np.full(shape + (len(weight_dates), len(ASSET_NAMES)), np.nan)
+    portfolio_vol = np.full(shape + (len(weight_dates),), np.nan)
+    risk_contrib = np.full(weights.shape, np.nan)
+    mcr = np.full(weights.shape, np.nan)
+    metrics = np.full(shape + (len(METRICS),), np.nan)
+
+    for (s, risk_score), (flat, weights_df, risk_contrib_df, metric_values) in results.items():
+        returns[s, risk_score, dates.get_indexer(flat.index)] = flat['Daily Returns'].values
+        metrics[s, risk_score] = metric_values
+
+        rows = weight_dates.get_indexer(risk_contrib_df.index)
+        portfolio_vol[s, risk_score, rows] = risk_contrib_df['portfolio_vol'].values
+        for a, asset in enumerate(ASSET_NAMES):
+            if asset in weights_df.columns:
+                weights[s, risk_score, :, a] = weights_df[asset].values
+                risk_contrib[s, risk_score, rows, a] = risk_contrib_df[f'{asset}_risk_contrib'].values
+                mcr[s, risk_score, rows, a] = risk_contrib_df[f'{asset}_mcr'].values
+
+    # Written next to the target and renamed, so the page never reads a partial file
+    temp_file = output_file + ".tmp.npz"
+    np.savez_compressed(
+        temp_file,
+        selections=np.array(selections, dtype=np.int8),
+        risk_scores=np.array(RISK_SCORES),
+        dates=dates.values.astype('datetime64[ns]').astype(np.int64),
+        weight_dates=weight_dates.values.astype('datetime64[ns]').astype(np.int64),
+        returns=returns,
+        weights=weights,
+        portfolio_vol=portfolio_vol,
+        risk_contrib=risk_contrib,
+        mcr=mcr,
+        metrics=metrics,
+    )
+    os.replace(temp_file, output_file)
+    print(f"Mean-variance lookup exported to {output_file}")
+
+
+@lru_cache(maxsize=4)
+def load_meanvar_lookup(lookup_file, mtime):
+    """Load the lookup arrays (cached per file version)"""
+    with np.load(lookup_file) as data:
+        return {key: data[key] for key in data.files}
+
+
+def lookup_meanvar(selected_assets_list, risk_score, lookup_file):
+    """
+    Precomputed results for a selection and risk score, in the shape returned by the live pipeline:
+    (flat returns DataFrame, weights_df, risk_contrib_df, (mean, vol, sharpe, cumu)).
+    Returns None if the lookup file or the configuration is missing
+    """
+    if not os.path.exists(lookup_file):
+        return None
+    lookup = load_meanvar_lookup(lookup_file, os.path.getmtime(lookup_file))
+
+    matches = np.where(np.all(lookup['selections'] == np.array(selected_assets_list), axis=1))[0]
+    if len(matches) == 0 or risk_score not in lookup['risk_scores']:
+        return None
+    s = matches[0]
+    r = int(np.where(lookup['risk_scores'] == risk_score)[0][0])
+
+    assets = [a for a, include in enumerate(selected_assets_list) if include == 1]
+    names = [ASSET_NAMES[a] for a in assets]
+
+    # Portfolio daily returns
+    returns = lookup['returns'][s, r]
+    available = ~np.isnan(returns)
+    flat = pd.DataFrame({'Daily Returns': returns[available]},
+                        index=pd.DatetimeIndex(pd.to_datetime(lookup['dates'][available]), name='Date'))
+
+    # Weights at each rebalance date
+    weight_dates = pd.DatetimeIndex(pd.to_datetime(lookup['weight_dates']), name='date')
+    weights_df = pd.DataFrame(lookup['weights'][s, r][:, assets], index=weight_dates, columns=names)
+
+    # Risk contributions, same columns as calculate_risk_contribution
+    rows = ~np.isnan(lookup['portfolio_vol'][s, r])
+    risk_contrib_df = pd.DataFrame({'portfolio_vol': lookup['portfolio_vol'][s, r][rows]}, index=weight_dates[rows])
+    for a, asset in zip(assets, names):
+        risk_contrib_df[f'{asset}_weight'] = lookup['weights'][s, r][rows, a] * 100
+        risk_contrib_df[f'{asset}_risk_contrib'] = lookup['risk_contrib'][s, r][rows, a]
+        risk_contrib_df[f'{asset}_mcr'] = lookup['mcr'][s, r][rows, a]
+
+    return flat, weights_df, risk_contrib_df, tuple(lookup['metrics'][s, r])
+
+
+if __name__ == '__main__':
+    build_meanvar_lookup(str(Path(__file__).parent.parent / "dataImporter"))
@@ -0,0 +1,178 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import streamlit as st
+
+sys.path.append(str(Path(__file__).parent.parent))
+import utils.data_cache as dc
+import utils.meanvar_lookup as mvl
+import utils.stage_executor as se
+import utils.utilities as ut
+
+
+# Portfolio construction as background jobs.
+# Launch submits the construction to a worker pool shared by every session and keeps the job
+# handle in the session; the page polls the handle for the current stage and picks up the
+# result once it is done, so the script thread is never blocked by a construction.
+
+MAX_WORKERS = 4
+# Threads per construction for the independent per-class stages (1 runs them serially)
+STAGE_WORKERS = 4
+
+# Stages reported by a job, with the labels shown on the page ('rendering' is done by the page)
+STAGES = ['queued', 'load', 'erc', 'optimization', 'attribution', 'rendering']
+STAGE_LABELS = {
+    'queued': "Waiting for a worker...",
+    'load': "Loading returns...",
+    'erc': "Running the ERC backtests...",
+    'optimization': "Optimizing the mean-variance portfolio...",
+    'attribution': "Computing the risk contributions...",
+    'rendering': "Rendering the results...",
+}
+
+# Universes in the order of the 6-element selection list
+# [ Equity(Std), Equity(ESG) ,Commodity(Std), Commodity(ESG), Crypto, Bonds]
+ASSET_UNIVERSES = ['equity', 'equity_esg', 'commodity', 'commodity_esg', 'crypto', 'bonds']
+
+LOOKUP_FILE = os.path.join(dc.DATA_DIR, "meanvar_lookup.npz")
+
+
+class Job:
+    """Handle on a submitted construction, polled by the page"""
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.stage = 'queued'
+        self.submitted = time.time()
+        self.timings = {}
+        self.future = None
+        self.lock = threading.Lock()
+
+    def report(self, stage):
+        # Stages of different asset classes overlap, the reported stage only moves forward
+        with self.lock:
+            if stage in STAGES and STAGES.index(stage) > STAGES.index(self.stage):
+                self.timings[stage] = time.time() - self.submitted
+                self.stage = stage
+
+    @property
+    def progress(self):
+        return STAGES.index(self.stage) / len(STAGES)
+
+    @property
+    def label(self):
+        return STAGE_LABELS[self.stage]
+
+    def done(self):
+        return self.future.done()
+
+    def cancel(self):
+        """
+        Drop a job that is no longer wanted: a queued job never runs. A job already running
+        cannot be interrupted, it runs to completion and its result is discarded
+        """
+        return self.future.cancel()
+
+    def result(self):
+        """Construction result, raises the job's exception if it failed"""
+        return self.future.result()
+
+
+@st.cache_resource
+def job_pool():
+    return ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix='portfolio')
+
+
+@st.cache_resource
+def meanvar_lookup_build():
+    """
+    Builds the mean-variance lookup in the background on first start when it is missing
+    (it is shipped with the data and refreshed by the import pipeline); constructions take
+    the live path until it is written. Returns the build's future, None if nothing to build
+    """
+    if os.path.exists(LOOKUP_FILE):
+        return None
+    return job_pool().submit(mvl.build_meanvar_lookup, dc.DATA_DIR, LOOKUP_FILE)
+
+
+def universe_flat(universe):
+    """Daily returns of a universe's ERC portfolio (of the index for bonds)"""
+    if universe == 'bonds':
+        return dc.bonds_performance()[0]
+    return dc.erc_universe(universe)[0]
+
+
+def build_portfolio(selected_assets_list, risk_score, report=None):
+    """
+    Mean-variance portfolio over the selected ERC portfolios.
+    report(stage): optional callback receiving the stage names as the construction goes
+    (stage prefixes: load, erc, combine, optimization, attribution)
+    Returns a dict with the inputs, flat daily returns, daily returns, weights, risk contributions, metrics
+    and the seconds spent in each stage
+    """
+    report = report or (lambda stage: None)
+    inputs = (tuple(selected_assets_list), risk_score)
+
+    # 1. Precomputed results for this selection and risk score, if available
+    report('load')
+    lookup = mvl.lookup_meanvar(list(selected_assets_list), risk_score, LOOKUP_FILE)
+
+    if lookup is not None:
+        MeanVar_flat, weights_df, risk_contrib_df, metrics = lookup
+        all_portfolio_returns = MeanVar_flat['Daily Returns']
+        timings = {}
+    else:
+        # Only the selected universes are loaded and backtested, each class independently
+        universes = [u for u, chosen in zip(ASSET_UNIVERSES, selected_assets_list) if chosen]
+        executor = se.StageExecutor(max_workers=STAGE_WORKERS,
+                                    on_start=lambda name: report(name.split('_')[0]))
+        for universe in universes:
+            executor.add(f"load_{universe}", partial(dc.panel, universe))
+            # The backtest reads the loaded panel from the shared cache
+            executor.add(f"erc_{universe}", lambda panel, universe=universe: universe_flat(universe),
+                         deps=[f"load_{universe}"])
+
+        # 2. ERC performance of the selected universes joined, then the final portfolio
+        def combine(*flats):
+            flats = dict(zip(universes, flats))
+            return ut.combine_returns(*[flats.get(u) for u in ASSET_UNIVERSES], list(selected_assets_list))
+
+        def optimization(combined_returns):
+            risk_aversion = ut.riskscore_to_aversion(risk_score)
+            all_portfolio_returns, weights_df = ut.meanvar_portfolio(combined_returns, risk_aversion)
+            return all_portfolio_returns, weights_df, ut.erc_performance(all_portfolio_returns, combined_returns, 2018)
+
+        def attribution(combined_returns, portfolio):
+            return ut.calculate_risk_contribution(portfolio[1], combined_returns)
+
+        executor.add('combine', combine, deps=[f"erc_{universe}" for universe in universes])
+        executor.add('optimization', optimization, deps=['combine'])
+        executor.add('attribution', attribution, deps=['combine', 'optimization'])
+
+        results = executor.run()
+        all_portfolio_returns, weights_df, (MeanVar_flat, *metrics) = results['optimization']
+        risk_contrib_df = results['attribution']
+        timings = executor.timings
+
+    return {
+        'inputs': inputs,
+        'flat': MeanVar_flat,
+        'daily_returns': all_portfolio_returns,
+        'weights': weights_df,
+        'risk_contributions': risk_contrib_df,
+        'metrics': tuple(metrics),
+        'timings': timings,
+    }
+
+
+def submit_portfolio(selected_assets_list, risk_score):
+    """Start a construction on the worker pool, returns its Job handle immediately"""
+    meanvar_lookup_build()
+    job = Job((tuple(selected_assets_list), risk_score))
+    job.future = job_pool().submit(build_portfolio, selected_assets_list, risk_score, job.report)
+    return job
@@ -0,0 +1,102 @@
+import numpy as np
+from functools import lru_cache
+
+
+# Long-only, fully invested mean-variance problem
+#
+#   max_w  mu' w - 0.5 * gamma * w' S w      s.t.  sum(w) = 1,  w >= 0
+#
+# For a given support (set of assets with w_i > 0) the optimum solves a small linear
+# KKT system. The problem is convex, so the support whose solution is primal feasible
+# (w >= 0) and dual feasible (no excluded asset would improve the utility) is the exact
+# optimum. With at most a handful of asset classes all supports, of all the problems
+# given, are solved in one batched np.linalg.solve call.
+
+@lru_cache(maxsize=None)
+def simplex_supports(num_assets):
+    """Boolean matrix of every non-empty subset of the assets (one row per support)"""
+    codes = np.arange(1, 2**num_assets)
+    return (codes[:, None] >> np.arange(num_assets)) & 1 == 1
+
+
+def kkt_systems(means, cov_matrices, risk_aversion, supports):
+    """
+    Stack the KKT system of every support for every problem, assets outside the support are pinned to 0.
+    means: (problems, assets), cov_matrices: (problems, assets, assets)
+    Returns lhs (problems, supports, assets + 1, assets + 1) and rhs (problems, supports, assets + 1)
+    """
+    num_problems, num_assets = means.shape
+    num_supports = len(supports)
+    both = supports[:, :, None] & supports[:, None, :]
+
+    lhs = np.zeros((num_problems, num_supports, num_assets + 1, num_assets + 1))
+    lhs[:, :, :num_assets, :num_assets] = np.where(both, risk_aversion * cov_matrices[:, None], 0.)
+    lhs[:, :, np.arange(num_assets), np.arange(num_assets)] += ~supports
+    lhs[:, :, :num_assets, num_assets] = supports
+    lhs[:, :, num_assets, :num_assets] = supports
+
+    rhs = np.zeros((num_problems, num_supports, num_assets + 1))
+    rhs[:, :, :num_assets] = np.where(supports, means[:, None], 0.)
+    rhs[:, :, num_assets] = 1.
+    return lhs, rhs
+
+
+def solve_simplex_qp(means, cov_matrix, risk_aversion, tol=1e-10):
+    """
+    Exact long-only, fully invested mean-variance weights (active-set enumeration).
+    """
+    means = np.asarray(means, dtype=float)
+    cov_matrix = np.asarray(cov_matrix, dtype=float)
+    return solve_simplex_qp_batch(means[None], cov_matrix[None], risk_aversion, tol)[0]
+
+
+def solve_simplex_qp_batch(means, cov_matrices, risk_aversion, tol=1e-10):
+    """
+    Exact weights of many independent problems (e.g. every monthly rebalance) at once.
+    means: (problems, assets), cov_matrices: (problems, assets, assets)
+    Returns the weights as a (problems, assets) array
+    """
+    means = np.asarray(means, dtype=float)
+    cov_matrices = np.asarray(cov_matrices, dtype=float)
+    num_problems, num_assets = means.shape
+
+    # Without risk aversion the problem is linear: everything in the best expected return
+    if risk_aversion == 0:
+        weights = np.zeros((num_problems, num_assets))
+        weights[np.arange(num_problems), np.argmax(means, axis=1)] = 1.
+        return weights
+
+    supports = simplex_supports(num_assets)
+    lhs, rhs = kkt_systems(means, cov_matrices, risk_aversion, supports)
+
+    try:
+        solutions = np.linalg.solve(lhs, rhs[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        # Singular covariance on some supports (e.g. duplicated assets): solve them one by one
+        solutions = np.full(rhs.shape, np.nan)
+        for p in range(num_problems):
+            for k in range(len(supports)):
+                try:
+                    solutions[p, k] = np.linalg.solve(lhs[p, k], rhs[p, k])
+                except np.linalg.LinAlgError:
+                    pass
+
+    weights = solutions[..., :num_assets]
+    nu = solutions[..., num_assets]
+
+    # KKT multipliers of the w >= 0 constraints
+    multipliers = nu[..., None] + risk_aversion * np.einsum('pki,pij->pkj', weights, cov_matrices) - means[:, None]
+
+    primal_feasible = np.all(weights >= -tol, axis=2)
+    dual_feasible = np.all(np.where(supports, True, multipliers >= -tol), axis=2)
+    optimal = primal_feasible & dual_feasible
+    # Numerical corner cases: fall back to the best primal feasible support
+    optimal = np.where(np.any(optimal, axis=1)[:, None], optimal, primal_feasible)
+
+    # Among candidates (several only in degenerate cases) keep the highest utility
+    utility = (np.einsum('pki,pi->pk', weights, means)
+               - 0.5 * risk_aversion * np.einsum('pki,pij,pkj->pk', weights, cov_matrices, weights))
+    utility = np.where(optimal & np.isfinite(utility), utility, -np.inf)
+    best = np.clip(weights[np.arange(num_problems), np.argmax(utility, axis=1)], 0., None)
+
+    return best / np.sum(best, axis=1, keepdims=True)
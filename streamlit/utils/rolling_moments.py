@@ -0,0 +1,81 @@
+import numpy as np
+
+
+class RollingMoments:
+    """
+    Sums and cross-products of a sliding window of return vectors.
+    Adding or dropping a day is a rank-one O(n^2) update, so moving the window
+    never rescans the history.
+    Returns are shifted by a constant vector before accumulating, which keeps the
+    cross-products small (covariances do not depend on the shift)
+    """
+
+    def __init__(self, num_assets, shift=None):
+        self.shift = np.zeros(num_assets) if shift is None else np.asarray(shift, dtype=float)
+        self.count = 0
+        self.sums = np.zeros(num_assets)
+        self.cross_products = np.zeros((num_assets, num_assets))
+
+    def add(self, returns):
+        x = returns - self.shift
+        self.count += 1
+        self.sums += x
+        self.cross_products += np.outer(x, x)
+
+    def drop(self, returns):
+        x = returns - self.shift
+        self.count -= 1
+        self.sums -= x
+        self.cross_products -= np.outer(x, x)
+
+    def mean(self):
+        return self.sums / self.count + self.shift
+
+    def cov(self):
+        """Sample covariance (ddof=1, as pandas .cov())"""
+        if self.count < 2:
+            return np.full(self.cross_products.shape, np.nan)
+        centered = self.sums / self.count
+        return (self.cross_products - self.count * np.outer(centered, centered)) / (self.count - 1)
+
+
+def rolling_moments(returns, dates, lookback=63, periods_per_year=252):
+    """
+    Annualized means and covariances of the last `lookback` rows strictly before each date,
+    i.e. returns.loc[returns.index < date].tail(lookback), in a single pass over the rows.
+    returns: DataFrame of daily returns without missing values, sorted by date
+    Returns means (dates x assets), covariances (dates x assets x assets) and the window sizes
+    """
+    values = returns.values
+    num_assets = values.shape[1]
+    window_ends = np.searchsorted(returns.index.values, np.asarray(dates, dtype='datetime64[ns]'), side='left')
+
+    means = np.full((len(dates), num_assets), np.nan)
+    covs = np.full((len(dates), num_assets, num_assets), np.nan)
+    counts = np.zeros(len(dates), dtype=int)
+
+    moments = RollingMoments(num_assets, shift=values.mean(axis=0) if len(values) else None)
+    start = end = 0
+
+    # Dates may come in any order, the window only ever slides forward
+    for k in np.argsort(window_ends, kind='stable'):
+        new_end = window_ends[k]
+        new_start = max(0, new_end - lookback)
+
+        if new_start >= end:
+            # No overlap with the current window: start over
+            moments = RollingMoments(num_assets, shift=moments.shift)
+            start = end = new_start
+        while end < new_end:
+            moments.add(values[end])
+            end += 1
+        while start < new_start:
+            moments.drop(values[start])
+            start += 1
+
+        counts[k] = moments.count
+        if moments.count > 0:
+            means[k] = moments.mean() * periods_per_year
+            covs[k] = moments.cov() * periods_per_year
+
+    return means, covs, counts
@@ -0,0 +1,39 @@
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+
+# Screens (ESG or any other exclusion rule) are boolean ticker masks over the base
+# return panels. The exclusion lists live in dataImporter/screens.json:
+#   {screen: {"description": ..., asset class: [excluded tickers]}}
+
+SCREENS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataImporter', 'screens.json')
+
+
+@lru_cache(maxsize=4)
+def read_screens(screens_file, mtime):
+    with open(screens_file) as f:
+        return json.load(f)
+
+
+def load_screens(screens_file=SCREENS_FILE):
+    """Screen definitions (cached per file version)"""
+    return read_screens(screens_file, os.path.getmtime(screens_file))
+
+
+def exclusions(asset_class, screen='esg', screens_file=SCREENS_FILE):
+    """Tickers of an asset class excluded by a screen (none if the screen does not cover the class)"""
+    return list(load_screens(screens_file)[screen].get(asset_class, []))
+
+
+def screen_mask(tickers, asset_class, screen='esg', screens_file=SCREENS_FILE):
+    """Boolean mask over `tickers`, True for the tickers kept by the screen"""
+    excluded = set(exclusions(asset_class, screen, screens_file))
+    return np.array([ticker not in excluded for ticker in tickers], dtype=bool)
+
+
+def apply_screen(df, asset_class, screen='esg', screens_file=SCREENS_FILE):
+    """Columns of a (dates x tickers) frame kept by a screen"""
+    return df.loc[:, screen_mask(df.columns, asset_class, screen, screens_file)]
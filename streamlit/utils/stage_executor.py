@@ -0,0 +1,83 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# In-memory stage graph: named callables whose arguments are the results of the stages they
+# depend on. Independent stages run concurrently on a thread pool (numpy and pandas release
+# the GIL in their heavy loops, and the Streamlit caches are shared between threads).
+
+class StageExecutor:
+    """
+    max_workers: stages running at once (1 runs everything serially in dependency order)
+    on_start(name): optional callback called when a stage starts
+    After run, timings holds the seconds spent in each stage
+    """
+
+    def __init__(self, max_workers=4, on_start=None):
+        self.max_workers = max_workers
+        self.on_start = on_start
+        self.stages = {}
+        self.timings = {}
+
+    def add(self, name, func, deps=()):
+        """func is called with the results of deps, in order"""
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already defined")
+        self.stages[name] = (func, list(deps))
+
+    def order(self):
+        """Stage names in dependency order (stages keep their insertion order when independent)"""
+        ordered, done = [], set()
+        while len(ordered) < len(self.stages):
+            ready = [name for name, (_, deps) in self.stages.items()
+                     if name not in done and set(deps) <= done]
+            if not ready:
+                missing = {d for _, deps in self.stages.values() for d in deps} - set(self.stages)
+                raise ValueError(f"Unknown stages {sorted(missing)}" if missing else
+                                 f"Cycle between stages {sorted(set(self.stages) - done)}")
+            ordered += ready
+            done.update(ready)
+        return ordered
+
+    def run_stage(self, name, results):
+        func, deps = self.stages[name]
+        if self.on_start is not None:
+            self.on_start(name)
+        started = time.perf_counter()
+        result = func(*[results[d] for d in deps])
+        self.timings[name] = time.perf_counter() - started
+        return result
+
+    def run_serial(self):
+        results = {}
+        for name in self.order():
+            results[name] = self.run_stage(name, results)
+        return results
+
+    def run(self):
+        """Run every stage, returns {stage name: result}"""
+        order = self.order()
+        self.timings = {}
+        if not self.max_workers or self.max_workers <= 1:
+            return self.run_serial()
+
+        try:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='stage')
+        except RuntimeError:
+            # No new threads (e.g. the interpreter is shutting down)
+            return self.run_serial()
+
+        results, running = {}, {}
+        with executor:
+            while len(results) < len(order):
+                # 1. Start every stage whose dependencies are done
+                for name in order:
+                    deps = self.stages[name][1]
+                    if name not in results and name not in running.values() and all(d in results for d in deps):
+                        running[executor.submit(self.run_stage, name, results)] = name
+
+                # 2. Collect the finished ones (a failed stage raises here)
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        return results
@@ -2,8 +2,12 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.optimize import minimize
 import seaborn as sns
+from utils.qp_solver import solve_simplex_qp_batch
+from utils.critical_line import critical_line, frontier_weights
+from utils.covariance_store import default_store
+from utils.backtester import Backtester
+from utils.screens import exclusions
 
 def dailyreturns(dailyprice) :
 
@@ -38,9 +42,10 @@ def dailyreturns(dailyprice) :
 
 
 
-def erc_portfolio(returns, weights_file='erc_weights.csv'):
+def erc_portfolio(returns, weights_file='erc_weights.csv', mask=None):
     """
     Calculate portfolio returns using pre-computed weights from CSV
+    mask: optional boolean mask over the returns columns (e.g. an ESG screen)
     """
     # Load weights from CSV
     weights_df = pd.read_csv(weights_file)
@@ -48,48 +53,20 @@ def erc_portfolio(returns, weights_file='erc_weights.csv'):
     
     portfolio_returns_by_year = []
     
-    returns['Date'] = pd.to_datetime(returns['Date'])
-    returns.set_index('Date', inplace=True)
+    if 'Date' in returns.columns:
+        returns['Date'] = pd.to_datetime(returns['Date'])
+        returns.set_index('Date', inplace=True)
     
-    # Iterate through each row in weights_df
-    for idx, row in weights_df.iterrows():
-        year = int(row['year'])
+    # Weights computed on a year's data are held during the next year, drifting daily
+    weight_schedule = weights_df.set_index('year')
+    weight_schedule.index = pd.to_datetime([f"{int(year) + 1}-01-01" for year in weight_schedule.index])
+    backtest = Backtester(returns, rebalance='annual', mask=mask).run(
+        weight_schedule, end=f"{int(weights_df['year'].max()) + 2}-01-01")
+    portfolio_returns = backtest['returns']
+    
+    for year in weights_df['year'].astype(int):
         print(f"Calculating returns for year {year} (applied to {year+1})...")
-        
-        # Extract weights and asset names for this year
-        weight_dict = row.drop('year').dropna().to_dict()
-        columns = list(weight_dict.keys())
-        erc_weights_year = np.array(list(weight_dict.values()))
-        
-        # Get ex-post returns for the next year
-        daily_returns_expost = returns.loc[returns.index.year == year + 1]
-        
-        # Filter to only include assets that were in the training period
-        daily_returns_expost = daily_returns_expost[
-            daily_returns_expost.columns.intersection(columns)
-        ]
-        
-        # Ensure weights match the available assets
-        available_columns = daily_returns_expost.columns.tolist()
-        weights = np.array([weight_dict[col] for col in available_columns])
-        
-        # Normalize weights in case some assets are missing
-        weights = weights / np.sum(weights)
-        
-        # Calculate daily portfolio returns with daily rebalancing
-        year_port_daily_returns = []
-        
-        for t in range(len(daily_returns_expost)):
-            # Calculate portfolio return for the current day
-            portfolio_return = np.dot(weights, daily_returns_expost.iloc[t])
-            year_port_daily_returns.append(portfolio_return)
-            
-            # Adjust weights for the next day (if it's not the last day)
-            if t < len(daily_returns_expost) - 1:
-                weights_numerator = weights * (1 + daily_returns_expost.iloc[t])
-                weights = weights_numerator / (1 + portfolio_return)
-        
-        portfolio_returns_by_year.append(year_port_daily_returns)
+        portfolio_returns_by_year.append(portfolio_returns[portfolio_returns.index.year == year + 1].tolist())
     
     return portfolio_returns_by_year
 
@@ -143,8 +120,9 @@ def bonds_performance(bonds_returns, startyear):
 
     returns = bonds_returns.rename(columns={'AGG': 'Daily Returns'})
     
-    returns['Date'] = pd.to_datetime(returns['Date'])
-    returns.set_index('Date', inplace=True)
+    if 'Date' in returns.columns:
+        returns['Date'] = pd.to_datetime(returns['Date'])
+        returns.set_index('Date', inplace=True)
     returns = returns[returns.index.year >= startyear]
     
     # Assuming 252 trading days in a year
@@ -311,76 +289,143 @@ def combine_returns(equity, equityESG, commodity, commodityESG, crypto, bonds, c
 
 
 
+# Monthly rebalancing dates of the mean-variance portfolio
+def monthly_rebalance_dates():
+    start_loop_date = pd.Timestamp('2018-01-01')
+    end_loop_date = pd.Timestamp('2025-10-01')
+    return pd.date_range(start=start_loop_date, end=end_loop_date, freq='MS')
+
+
+# Annualized means and covariances of the 63 days before each rebalance date
+def lookback_moments(combined_returns, rebalance_dates, lookback=63, store=None):
+    """
+    Returns means (dates x assets) and covariance matrices (dates x assets x assets),
+    updated incrementally as the window slides (see utils/rolling_moments.py) and
+    shared through the covariance store (see utils/covariance_store.py)
+    """
+    store = default_store if store is None else store
+    means, covs, _ = store.get_moments(combined_returns, rebalance_dates, lookback=lookback)
+    return means, covs
+
+
+#Efficient frontier of every rebalance (all risk aversions at once)
+def meanvar_frontier(combined_returns):
+    """
+    Critical line turning points for each monthly rebalance, using the same 63-day lookback
+    as meanvar_portfolio. Returns {month_start: (means, cov matrix, turning tolerances, turning weights)}
+    """
+    combined_returns.index = pd.to_datetime(combined_returns.index)
+    frontier = {}
+
+    monthly_periods = monthly_rebalance_dates()
+    asset_means_lookback, annualized_cov_matrix_lookback = lookback_moments(combined_returns, monthly_periods)
+
+    for k, month_start in enumerate(monthly_periods):
+        turning_t, turning_weights = critical_line(asset_means_lookback[k], annualized_cov_matrix_lookback[k])
+        frontier[month_start] = (asset_means_lookback[k], annualized_cov_matrix_lookback[k], turning_t, turning_weights)
+
+    return frontier
+
+
 #Mean-Var Portfolio with Weight Tracking
-def meanvar_portfolio(combined_returns, risk_aversion):
+def meanvar_portfolio(combined_returns, risk_aversion, frontier=None):
+    """
+    frontier: optional output of meanvar_frontier, the weights are then read off the
+    precomputed frontiers instead of solving one problem per month
+    """
     combined_returns.index = pd.to_datetime(combined_returns.index)
     risk_aversion_coefficient = risk_aversion
     all_portfolio_returns = []
-    all_weights = []  # Store weights with dates and asset names
     
-    start_loop_date = pd.Timestamp('2018-01-01')
-    end_loop_date = pd.Timestamp('2025-10-01')
-    monthly_periods = pd.date_range(start=start_loop_date, end=end_loop_date, freq='MS')
+    monthly_periods = monthly_rebalance_dates()
     
     asset_names = [col.replace(" Returns", "") for col in combined_returns.columns]
     
-    for month_start in monthly_periods:
-        lookback_data = combined_returns.loc[combined_returns.index < month_start].tail(63)
-        asset_means_lookback = lookback_data.mean() * 252
-        annualized_cov_matrix_lookback = lookback_data.cov() * 252
-        num_assets = len(asset_means_lookback)
-        initial_weights = np.array([1 / num_assets] * num_assets)
-        constraints = ({'type': 'eq', 'fun': lambda x: np.sum(x) - 1})
-        bounds = tuple((0, 1) for _ in range(num_assets))
-        
-        optimization_result = minimize(
-            negative_utility_function,
-            initial_weights,
-            args=(asset_means_lookback.values, annualized_cov_matrix_lookback.values, risk_aversion_coefficient),
-            method='SLSQP',
-            bounds=bounds,
-            constraints=constraints,
-            tol=1e-20
+    if frontier is not None:
+        all_optimal_weights = np.array([
+            frontier_weights(frontier[month_start][2], frontier[month_start][3], risk_aversion_coefficient)
+            for month_start in monthly_periods
+        ])
+    else:
+        # Exact long-only, fully invested optimum of every month in one batch (see utils/qp_solver.py)
+        asset_means_lookback, annualized_cov_matrix_lookback = lookback_moments(combined_returns, monthly_periods)
+        all_optimal_weights = solve_simplex_qp_batch(
+            asset_means_lookback,
+            annualized_cov_matrix_lookback,
+            risk_aversion_coefficient
         )
-        optimal_weights = optimization_result.x
-        
-        next_month_start = month_start + pd.DateOffset(months=1)
-        combined_returns_expost = combined_returns.loc[
-            (combined_returns.index >= month_start) & (combined_returns.index < next_month_start)
-        ]
-        
-        weights = optimal_weights
-        month_port_daily_returns = []
-        
-        # Store initial weights for this month
-        weight_dict = {'date': month_start}
-        for i, asset in enumerate(asset_names):
-            weight_dict[asset] = weights[i]
-        all_weights.append(weight_dict)
-        
-        for t in range(len(combined_returns_expost)):
-            portfolio_return = np.dot(weights, combined_returns_expost.iloc[t])
-            month_port_daily_returns.append(portfolio_return)
-            
-            if t < len(combined_returns_expost) - 1:
-                weights_numerator = weights * (1 + combined_returns_expost.iloc[t])
-                weights = weights_numerator / (1 + portfolio_return)
-        
-        all_portfolio_returns.append(month_port_daily_returns)
     
-    # Convert weights to DataFrame
-    weights_df = pd.DataFrame(all_weights)
-    weights_df.set_index('date', inplace=True)
+    # Rebalance to the optimal weights each month, drifting daily in between
+    weight_schedule = pd.DataFrame(all_optimal_weights, index=monthly_periods, columns=combined_returns.columns)
+    backtest = Backtester(combined_returns, rebalance='monthly').run(
+        weight_schedule, end=monthly_periods[-1] + pd.DateOffset(months=1))
+    
+    month_returns = dict(list(backtest['returns'].groupby(backtest['periods'])))
+    for month_start in monthly_periods:
+        all_portfolio_returns.append(month_returns[month_start].tolist() if month_start in month_returns else [])
+    
+    # Initial weights of each month, with asset names
+    weights_df = pd.DataFrame(all_optimal_weights, index=pd.DatetimeIndex(monthly_periods.values, name='date'),
+                              columns=asset_names)
     
     return all_portfolio_returns, weights_df
 
 
 
 
-def equity_to_esg(equity_data) : 
+#Backtest of several risk aversions at once
+def meanvar_scenarios(combined_returns, risk_aversions=None, startyear=2018):
+    """
+    Mean-variance backtests for a vector of risk aversions (all the risk scores by default).
+    Covariances and return slices are computed once and shared by every scenario.
+    Returns the daily returns (dates x scenarios) and a metrics table with one row per scenario
+    """
+    combined_returns.index = pd.to_datetime(combined_returns.index)
+    if risk_aversions is None:
+        risk_aversions = [riskscore_to_aversion(score) for score in range(11)]
+
+    monthly_periods = monthly_rebalance_dates()
+    asset_means_lookback, annualized_cov_matrix_lookback = lookback_moments(combined_returns, monthly_periods)
+
+    # scenarios x months x assets
+    scenario_weights = np.array([
+        solve_simplex_qp_batch(asset_means_lookback, annualized_cov_matrix_lookback, risk_aversion)
+        for risk_aversion in risk_aversions
+    ])
+
+    portfolio_returns, dates = Backtester(combined_returns, rebalance='monthly').run_scenarios(
+        monthly_periods, scenario_weights, end=monthly_periods[-1] + pd.DateOffset(months=1))
+
+    scenario_returns = pd.DataFrame(portfolio_returns, index=dates, columns=list(risk_aversions))
+    scenario_returns.columns.name = 'risk_aversion'
+    scenario_returns = scenario_returns[scenario_returns.index.year >= startyear]
+
+    return scenario_returns, performance_table(scenario_returns)
+
 
-    #list of commonly excluded firms of green fonds
-    excluded = [ 'MO', 'PM', 'XOM', 'CVX', 'COP', 'EOG', 'SLB', 'MPC', 'PSX', 'VLO', 'OXY', 'HES', 'DVN', 'FANG', 'MRO', 'APA', 'HAL', 'BKR', 'TRGP', 'WMB', 'KMI', 'OKE', 'LNG', 'EQT', 'CTRA', 'CF', 'MOS', 'CCJ', 'FCX', 'NEM', 'NUE', 'STLD', 'LMT', 'RTX', 'NOC', 'GD', 'BA', 'LHX', 'HWM', 'TXT', 'TSLA', 'META', 'GOOGL', 'GOOG', 'AMZN', 'NFLX', 'ORCL', 'CRM', 'INTC', 'AMD', 'NVDA', 'QCOM', 'AVGO', 'TXN', 'ADI', 'NKE', 'SBUX', 'MCD', 'YUM', 'CMG', 'DRI', 'GM', 'F', 'JNJ', 'UNH', 'PFE', 'ABBV', 'TMO', 'DHR', 'ABT', 'BMY', 'AMGN', 'GILD', 'CVS', 'CI', 'BRK.B', 'JPM', 'BAC', 'WFC', 'C', 'GS', 'MS', 'BLK', 'SCHW', 'USB', 'PNC', 'TFC', 'AXP', 'COF', 'DFS', 'NEE', 'DUK', 'SO', 'D', 'EXC', 'AEP', 'XEL', 'ED']
+# Same metrics as erc_performance, for every column of a daily returns DataFrame
+def performance_table(daily_returns):
+    trading_days_per_year = 252
+    risk_free_rate = 0.015
+
+    annualized_average_return = daily_returns.mean() * trading_days_per_year
+    annualized_volatility = daily_returns.std() * np.sqrt(trading_days_per_year)
+    sharpe_ratio = (annualized_average_return - risk_free_rate) / annualized_volatility
+    cumulative_return = (1 + daily_returns).prod() - 1
+
+    return pd.DataFrame({
+        'Annual Return': annualized_average_return,
+        'Annual Volatility': annualized_volatility,
+        'Sharpe Ratio': sharpe_ratio,
+        'Cumulative Return': cumulative_return,
+    })
+
+
+def equity_to_esg(equity_data, excluded=None) : 
+
+    #list of commonly excluded firms of green fonds (dataImporter/screens.json)
+    if excluded is None:
+        excluded = exclusions('equity', 'esg')
     
     # Filter equity_data to exclude the columns present in excluded_tickers
     equity_data_esg = equity_data.drop(columns=excluded, errors='ignore')
@@ -388,10 +433,11 @@ def equity_to_esg(equity_data) :
     return equity_data_esg
     
 
-def commodity_to_esg(commodity_data) : 
+def commodity_to_esg(commodity_data, excluded_commo=None) : 
 
-    #list of  excluded commodity
-    excluded_commo = [ 'CL=F', 'BZ=F','NG=F','HO=F','RB=F']
+    #list of  excluded commodity (dataImporter/screens.json)
+    if excluded_commo is None:
+        excluded_commo = exclusions('commodity', 'esg')
     
     # Filter commo_data to exclude the columns present in excluded_tickers
     commodity_data_esg = commodity_data.drop(columns=excluded_commo, errors='ignore')
@@ -578,28 +624,28 @@ def plot_drawdown(portfolio_returns, dates=None):
 
 
 
-def calculate_risk_contribution(weights_df, combined_returns):
+def calculate_risk_contribution(weights_df, combined_returns, store=None):
     """
     Calculate marginal and component risk contributions for each asset
-
+    Covariances come from the same store as meanvar_portfolio's (see utils/covariance_store.py)
     """
     combined_returns.index = pd.to_datetime(combined_returns.index)
     asset_names = [col.replace(" Returns", "") for col in combined_returns.columns]
     
     risk_contributions = []
     
-    for date in weights_df.index:
+    # Annualized covariance matrices over the same 63-day window as optimization
+    store = default_store if store is None else store
+    _, cov_matrices, lookback_counts = store.get_moments(combined_returns, weights_df.index, lookback=63)
+    
+    for k, date in enumerate(weights_df.index):
         # Get weights for this period
         weights = weights_df.loc[date].values
         
-        # Get lookback data (same 63-day window as optimization)
-        lookback_data = combined_returns.loc[combined_returns.index < date].tail(63)
-        
-        if len(lookback_data) < 63:
+        if lookback_counts[k] < 63:
             continue
         
-        # Calculate covariance matrix (annualized)
-        cov_matrix = lookback_data.cov().values * 252
+        cov_matrix = cov_matrices[k]
         
         # Portfolio variance
         portfolio_variance = np.dot(weights, np.dot(cov_matrix, weights))